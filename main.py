@@ -2,9 +2,10 @@ import json
 from typing import Optional, Any
 
 from src.consts import CONFIG, MAIN_STATUS_FILE_PATH, BASE_DBS_PATH, BASE_STAT_PATH, logger, BASE_DATA_PATH, \
-    DATA_SOURCE_DUMP, DATA_SOURCE_REPACK, BASE_METHODS_CONFIG_PATH, PROJECT_PATH
+    DATA_SOURCE_DUMP, DATA_SOURCE_REPACK, BASE_METHODS_CONFIG_PATH, PROJECT_PATH, BASE_CHECKPOINT_PATH
 from src.data_iterators.base_data_iterator import base_month_data_iterator
 from src.data_iterators.repacked_data_iterator import repack_iterator
+from src.db.db import dispose_engines
 from src.models import MethodDefinition, IterationSettings
 from src.process_methods.abstract_method import IterationMethod, create_methods
 from src.status import MainStatus, MonthDatasetStatus
@@ -19,10 +20,13 @@ def reset() -> None:
             return
     if MAIN_STATUS_FILE_PATH.exists():
         MAIN_STATUS_FILE_PATH.unlink()
+    dispose_engines()
     for db in BASE_DBS_PATH.glob("*"):
         db.unlink()
     for stats_file in BASE_STAT_PATH.glob("*"):
         stats_file.unlink()
+    for checkpoint_file in BASE_CHECKPOINT_PATH.glob("*"):
+        checkpoint_file.unlink()
 
 
 def iter_dumps_main(settings: IterationSettings, month_ds_status: Optional[MonthDatasetStatus],
@@ -94,6 +98,16 @@ def init_methods():
                                                  method_type=RepackEntriesMethod,
                                                  config=methods_config.get(repacke_name, {}))
 
+    # Full posts DB
+
+    from src.process_methods.full_post_db_method import FullPostDBMethod
+
+    full_posts_name = FullPostDBMethod.name()
+    print(f"Full posts config defined: {full_posts_name in methods_config}")
+    all_methods[full_posts_name] = MethodDefinition(method_name=full_posts_name,
+                                                    method_type=FullPostDBMethod,
+                                                    config=methods_config.get(full_posts_name, {}))
+
     try:
         from src.process_methods.auto_relecanve_check_method import AutoRelevanceMethod
 
@@ -0,0 +1,104 @@
+"""
+Checkpoints of month runs over the dump.
+Before the first and after each tar file (day), the names of the processed tar files and the state snapshots of
+the methods are stored.
+A restarted run (with the same methods, method configs and languages) restores the method states and skips
+the processed tar files.
+The checkpoint is removed, when the run finishes.
+"""
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional, TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from src.consts import BASE_CHECKPOINT_PATH, logger
+from src.models import IterationSettings
+from src.util import year_month_str
+
+if TYPE_CHECKING:
+    from src.process_methods.abstract_method import IterationMethod
+
+
+@dataclass
+class MonthCheckpoint:
+    method_names: list[str]
+    # the checkpoint is only used for the same method configs and languages
+    method_configs: list[Any] = field(default_factory=list)
+    languages: list[str] = field(default_factory=list)
+    tar_files: list[str] = field(default_factory=list)
+    # method name -> state
+    method_states: dict[str, Any] = field(default_factory=dict)
+
+
+def _method_config(method: "IterationMethod") -> Any:
+    """
+    comparable (and picklable) config of a method
+    """
+    if isinstance(method.config, BaseModel):
+        return method.config.model_dump()
+    return method.config
+
+
+class MonthCheckpointer:
+
+    def __init__(self, settings: IterationSettings, methods: list["IterationMethod"]):
+        self.methods = methods
+        self.path: Path = BASE_CHECKPOINT_PATH / f"{year_month_str(settings.year, settings.month)}.pickle"
+        self.checkpoint = MonthCheckpoint(method_names=[method.name() for method in methods],
+                                          method_configs=[_method_config(method) for method in methods],
+                                          languages=sorted(settings.languages))
+
+    def restore(self) -> Optional[list[str]]:
+        """
+        restore the method states of an existing checkpoint (with the same methods)
+        :return: the processed tar files. None, if there is no checkpoint to resume from
+        """
+        if not self.path.exists():
+            return None
+        checkpoint: MonthCheckpoint = pickle.loads(self.path.read_bytes())
+        if checkpoint.method_names != self.checkpoint.method_names:
+            logger.warning(f"checkpoint {self.path.name} is for other methods: {checkpoint.method_names}. Ignoring it")
+            return None
+        if getattr(checkpoint, "method_configs", None) != self.checkpoint.method_configs:
+            logger.warning(f"checkpoint {self.path.name} is for other method configs. Ignoring it")
+            return None
+        if getattr(checkpoint, "languages", None) != self.checkpoint.languages:
+            logger.warning(f"checkpoint {self.path.name} is for other languages: {checkpoint.languages}. Ignoring it")
+            return None
+        for method in self.methods:
+            method.restore_checkpoint(checkpoint.method_states.get(method.name()))
+        self.checkpoint = checkpoint
+        logger.info(f"resuming from checkpoint, after tar files: {checkpoint.tar_files}")
+        return checkpoint.tar_files
+
+    def is_done(self, tar_file_date_name: str) -> bool:
+        return tar_file_date_name in self.checkpoint.tar_files
+
+    def tar_file_done(self, tar_file_date_name: str):
+        """
+        store a checkpoint after a tar file has been processed
+        """
+        self.checkpoint.tar_files.append(tar_file_date_name)
+        self.store()
+
+    def store(self):
+        self.checkpoint.method_states = {method.name(): method.checkpoint_state() for method in self.methods}
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_bytes(pickle.dumps(self.checkpoint))
+        temp_path.replace(self.path)
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+def init_checkpointer(settings: IterationSettings, methods: list["IterationMethod"],
+                      use_checkpoints: bool) -> Optional[MonthCheckpointer]:
+    if not use_checkpoints:
+        return None
+    checkpointer = MonthCheckpointer(settings, methods)
+    if checkpointer.restore() is None:
+        # the initial states, so that a run that is interrupted in its first tar file is resumed as well
+        checkpointer.store()
+    return checkpointer
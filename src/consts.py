@@ -14,6 +14,8 @@ BASE_METHODS_CONFIG_PATH = BASE_DATA_PATH / "method_configs"
 BASE_DBS_PATH = BASE_DATA_PATH / "sqlite_dbs"
 BASE_STAT_PATH = BASE_DATA_PATH / "stats"
 BASE_REPACK_PATH = BASE_DATA_PATH / "repack"
+BASE_TAR_INDEX_PATH = BASE_DATA_PATH / "tar_index"
+BASE_CHECKPOINT_PATH = BASE_DATA_PATH / "checkpoints"
 MAIN_STATUS_FILE_PATH = BASE_DATA_PATH / "status.json"
 AUTO_RELEVANT_COLLECTION = BASE_DATA_PATH / "auto-relevant"
 
@@ -30,7 +32,8 @@ ANNOT_EXTRA_TEST_ROUND = "1"
 ANNOT_EXTRA_TEST_ROUND_EXPERIMENT = "1x"
 ANOOT_EXTRA_TEST_HAS_MEDIA = "1m"
 
-for p in [BASE_DATA_PATH, BASE_DBS_PATH, BASE_METHODS_CONFIG_PATH, BASE_REPACK_PATH, BASE_STAT_PATH, ANNOTATED_BASE_PATH, LOGS_BASE_PATH,
+for p in [BASE_DATA_PATH, BASE_DBS_PATH, BASE_METHODS_CONFIG_PATH, BASE_REPACK_PATH, BASE_STAT_PATH, BASE_TAR_INDEX_PATH,
+          BASE_CHECKPOINT_PATH, ANNOTATED_BASE_PATH, LOGS_BASE_PATH,
           BASE_LABELSTUDIO_DATA_PATH, LABELSTUDIO_LABEL_CONFIGS_PATH, AUTO_RELEVANT_COLLECTION]:
     p.mkdir(parents=True, exist_ok=True)
 
@@ -64,6 +67,25 @@ class Config(BaseSettings):
     METHODS: list[str] = []
     METHODS_CONFIG_FILE: Optional[str] = None
     CONFIRM_RUN: bool = True
+    # number of worker processes (1: no multiprocessing)
+    NUM_WORKERS: int = Field(1, ge=1)
+    # backend for decoding the posts (falls back to json, if not installed)
+    JSON_DECODER: Literal["json", "orjson", "msgspec"] = "orjson"
+    # store and use line offsets of dump files, when picking posts by their location index (see src/line_index.py).
+    # picking posts then writes sqlite dbs into BASE_TAR_INDEX_PATH
+    USE_LINE_INDEX: bool = False
+    # buffer size (bytes) for reading compressed files
+    READ_BUFFER_SIZE: int = Field(1024 * 1024, ge=8192)
+    # number of files (dump members/ repack files), that are read and decompressed ahead in a background thread
+    # (0: no prefetching)
+    PREFETCH_QUEUE_DEPTH: int = Field(0, ge=0)
+    # store method states after each tar file of a dump, and resume from there, if a run did not finish
+    USE_CHECKPOINTS: bool = True
+    # sqlite dbs (src/db/db.py): connections in the pool of each engine and settings of each connection
+    SQLITE_POOL_SIZE: int = Field(5, ge=1)
+    SQLITE_MMAP_SIZE_MB: int = Field(256, ge=0)
+    SQLITE_CACHE_SIZE_MB: int = Field(64, ge=1)
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(5000, ge=0)
     LOG_LEVEL: Literal["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"] = "INFO"
     FILE_LOG_LEVEL: Literal["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"] = "WARNING"
     # for something else,... setting up a pg db
@@ -122,3 +144,4 @@ METHOD_ANNOTATION_DB = "annotation"
 METHOD_MEDIA_FILTER = "media-filter"
 METHOD_REPACK = "repack"
 METHOD_AUTO_RELEVANCE = "auto_relevance"
+METHOD_FULL_POSTS = "full-posts"
@@ -6,18 +6,22 @@ This is the iterator for the raw dump files . not filtered and in the format
 - jsonl.gz for each minute
 
 """
-import io
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import cast, Optional
+from typing import cast, Optional, Any, Type, Iterable
 
-import jsonlines
 from tqdm import tqdm
 
+from src.checkpoint import MonthCheckpointer, init_checkpointer
 from src.consts import locationindex_type, CONFIG, get_logger
+from src.db.db import dispose_engines
+from src.json_decoder import get_loads
 from src.models import IterationSettings, ProcessCancel, ProcessSkipType
-from src.process_methods.abstract_method import IterationMethod
+from src.process_methods.abstract_method import IterationMethod, method_definitions, create_worker_methods, \
+    process_batch_with_methods
 from src.status import MonthDatasetStatus
-from src.util import get_base_dump_path, iter_tar_files, tarfile_datestr, iter_jsonl_files_data
+from src.util import get_base_dump_path, iter_tar_files, tarfile_datestr, iter_jsonl_files_lines, prefetch
 
 logger = get_logger(__file__, "INFO")
 
@@ -40,14 +44,47 @@ def _base_jsonl_line_processor(jsonl_entry: dict,
     return None
 
 
-def _base_jsonl_file_iterator(jsonl_file_data: bytes,
+def _base_jsonl_file_batch_iterator(jsonl_lines: Iterable[bytes],
+                                    location_index: list[str],
+                                    methods: list[IterationMethod]) -> None:
+    """
+    decode the whole jsonl file and pass it as one batch through the methods
+    """
+    loads = get_loads()
+    line_filter = methods[0].raw_line_filter() if methods else None
+    location_prefix = tuple(location_index)
+
+    posts: list[dict] = []
+    location_indices: list[locationindex_type] = []
+    for line_index, jsonl_line in enumerate(jsonl_lines):
+        if line_filter and not line_filter(jsonl_line):
+            continue
+        jsonl_entry = loads(jsonl_line)
+        # "data" wrapped, or plain (2022-01,02)
+        posts.append(jsonl_entry["data"] if "data" in jsonl_entry else jsonl_entry)
+        location_indices.append(cast(locationindex_type, (*location_prefix, line_index)))
+    process_batch_with_methods(methods, posts, location_indices)
+
+
+def _base_jsonl_file_iterator(jsonl_lines: Iterable[bytes],
                               location_index: list[str],
                               methods: list[IterationMethod]) -> Optional[ProcessSkipType]:
+    if methods and all(method.supports_batch() for method in methods):
+        _base_jsonl_file_batch_iterator(jsonl_lines, location_index, methods)
+        return None
+
     entries_count = 0
+    loads = get_loads()
+    # only the first method sees all posts, so only its raw line filter can be used
+    line_filter = methods[0].raw_line_filter() if methods else None
 
-    for jsonl_entry in jsonlines.Reader(io.BytesIO(jsonl_file_data)):
-        location_index.append(entries_count)
+    for jsonl_line in jsonl_lines:
+        line_index = entries_count
         entries_count += 1
+        if line_filter and not line_filter(jsonl_line):
+            continue
+        jsonl_entry = loads(jsonl_line)
+        location_index.append(line_index)
         # language and original tweet filter
         potential_skip = _base_jsonl_line_processor(jsonl_entry, cast(locationindex_type, location_index.copy()),
                                                     methods)
@@ -63,11 +100,15 @@ def _base_tar_file_iterator(tar_file: Path,
                             location_index: list[str],
                             methods: list[IterationMethod]) -> Optional[ProcessSkipType]:
     test_count = 0
-    # for jsonl_file_name, jsonl_file_data in iter_jsonl_files_data(tar_file):
-    for jsonl_file_name, jsonl_file_data in tqdm(iter_jsonl_files_data(tar_file)):
+    members = iter_jsonl_files_lines(tar_file)
+    if CONFIG.PREFETCH_QUEUE_DEPTH:
+        # the members are read and decompressed completely in the background thread
+        members = prefetch(((jsonl_file_name, list(jsonl_lines)) for jsonl_file_name, jsonl_lines in members),
+                           CONFIG.PREFETCH_QUEUE_DEPTH)
+    for jsonl_file_name, jsonl_lines in tqdm(members):
         location_index.append(jsonl_file_name)
         # process jsonl file
-        potential_skip = _base_jsonl_file_iterator(jsonl_file_data, location_index, methods)
+        potential_skip = _base_jsonl_file_iterator(jsonl_lines, location_index, methods)
         location_index.pop()
         test_count += 1
         if potential_skip:
@@ -77,17 +118,26 @@ def _base_tar_file_iterator(tar_file: Path,
             break
 
 
-def _base_dump_iterator(dump_path: Path, methods: list[IterationMethod]):
-    dump_file_date_name = dump_path.name.lstrip("archiveteam-twitter-stream")
-    location_index: list[str] = [dump_file_date_name]
-    logger.debug(f"dump: {dump_file_date_name}")
-    # iter the tar files in the dump
+def _dump_tar_files(dump_path: Path) -> list[Path]:
     tar_files = list(iter_tar_files(dump_path))
     if CONFIG.TEST_MODE:
         logger.info(f"Test mode only takes {CONFIG.TEST_NUM_TAR_FILES} tar file(s)")
         tar_files = tar_files[:CONFIG.TEST_NUM_TAR_FILES]
+    return tar_files
+
+
+def _base_dump_iterator(dump_path: Path, methods: list[IterationMethod],
+                        checkpointer: Optional[MonthCheckpointer] = None):
+    dump_file_date_name = dump_path.name.lstrip("archiveteam-twitter-stream")
+    location_index: list[str] = [dump_file_date_name]
+    logger.debug(f"dump: {dump_file_date_name}")
+    # iter the tar files in the dump
+    tar_files = _dump_tar_files(dump_path)
     for idx, tar_file in enumerate(tar_files):
         tar_file_date_name = tarfile_datestr(tar_file)
+        if checkpointer and checkpointer.is_done(tar_file_date_name):
+            logger.info(f"tar file: {tar_file_date_name} - already processed (checkpoint)")
+            continue
         logger.info(f"tar file: {tar_file_date_name} - {idx + 1} / {len(tar_files)}")
         location_index.append(tar_file_date_name)
         # process tar file
@@ -95,6 +145,61 @@ def _base_dump_iterator(dump_path: Path, methods: list[IterationMethod]):
         if potential_skip:
             return potential_skip
         location_index.pop()
+        if checkpointer:
+            checkpointer.tar_file_done(tar_file_date_name)
+
+
+def _parallel_tar_file_worker(tar_file: Path,
+                              dump_file_date_name: str,
+                              settings: IterationSettings,
+                              method_defs: list[tuple[Type[IterationMethod], Any]]) -> list[Any]:
+    """
+    runs in a worker process. processes one tar file (day) with its own method instances
+    and returns their partial results
+    """
+    tar_file_date_name = tarfile_datestr(tar_file)
+    methods = create_worker_methods(settings, method_defs, tar_file_date_name)
+    _base_tar_file_iterator(tar_file, [dump_file_date_name, tar_file_date_name], methods)
+    return [method.partial_result() for method in methods]
+
+
+def _parallel_dump_iterator(dump_path: Path, settings: IterationSettings, methods: list[IterationMethod],
+                            checkpointer: Optional[MonthCheckpointer] = None):
+    """
+    hands each tar file to a worker process and merges the partial results
+    into the given methods, in the order of the tar files
+    """
+    dump_file_date_name = dump_path.name.lstrip("archiveteam-twitter-stream")
+    logger.debug(f"dump: {dump_file_date_name}")
+    tar_files = []
+    for tar_file in _dump_tar_files(dump_path):
+        if checkpointer and checkpointer.is_done(tarfile_datestr(tar_file)):
+            logger.info(f"tar file: {tarfile_datestr(tar_file)} - already processed (checkpoint)")
+            continue
+        if any(method.skip_tar_file(tarfile_datestr(tar_file)) for method in methods):
+            logger.info(f"skipping tar file: {tarfile_datestr(tar_file)}")
+            if checkpointer:
+                # like in a single process, where skipped tar files are done as well
+                checkpointer.tar_file_done(tarfile_datestr(tar_file))
+            continue
+        tar_files.append(tar_file)
+
+    method_defs = method_definitions(methods)
+    # the workers must not reuse the db connections of this process
+    with ProcessPoolExecutor(max_workers=CONFIG.NUM_WORKERS,
+                             initializer=dispose_engines,
+                             initargs=(False,)) as executor:
+        results = executor.map(_parallel_tar_file_worker,
+                               tar_files,
+                               repeat(dump_file_date_name),
+                               repeat(settings),
+                               repeat(method_defs))
+        for idx, (tar_file, partials) in enumerate(zip(tar_files, results)):
+            logger.info(f"tar file: {tarfile_datestr(tar_file)} - {idx + 1} / {len(tar_files)}")
+            for method, partial in zip(methods, partials):
+                method.merge(partial)
+            if checkpointer:
+                checkpointer.tar_file_done(tarfile_datestr(tar_file))
 
 
 def base_month_data_iterator(settings: IterationSettings,
@@ -104,10 +209,21 @@ def base_month_data_iterator(settings: IterationSettings,
     if not dump_path.exists():
         logger.error(f"dumppath {dump_path} does not exist")
         return
+    checkpointer = init_checkpointer(settings, methods, CONFIG.USE_CHECKPOINTS)
     # call process func
-    _base_dump_iterator(dump_path, methods)
+    if CONFIG.NUM_WORKERS > 1:
+        not_parallel = [method.name() for method in methods if not method.parallel_safe()]
+        if not_parallel:
+            logger.warning(f"methods {not_parallel} cannot run in parallel. Falling back to a single process")
+            _base_dump_iterator(dump_path, methods, checkpointer)
+        else:
+            _parallel_dump_iterator(dump_path, settings, methods, checkpointer)
+    else:
+        _base_dump_iterator(dump_path, methods, checkpointer)
 
     for method in methods:
         if status:
             method.set_ds_status_field(status)
         method.finalize()
+    if checkpointer:
+        checkpointer.remove()
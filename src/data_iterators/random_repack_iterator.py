@@ -1,7 +1,7 @@
-import json
 import random
-import sys
-from typing import Optional
+from array import array
+from bisect import bisect_right
+from typing import Optional, Iterable
 
 from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
@@ -9,10 +9,28 @@ from sqlalchemy.orm import sessionmaker
 from src.consts import BASE_STAT_PATH, BASE_REPACK_PATH
 from src.data_iterators.base_iterator import BaseIterator
 from src.helper.repack_stats import RepackStats
+from src.json_decoder import get_loads
 from src.models import IterationSettings, ProcessCancel
 from src.process_methods.abstract_method import IterationMethod
+from src.repack_format import iter_repack_file_records
 from src.status import MonthDatasetStatus
-from src.util import read_gzip_file, iter_jsonl_data, iter_jsonl_data2
+
+
+def read_repack_file_posts(rel_path: str, offsets: Iterable[int]) -> dict[int, dict]:
+    """
+    read the posts at some (0-based) offsets of a repack file, in one pass that stops after the last offset
+    """
+    offsets = set(offsets)
+    last_offset = max(offsets)
+    loads = get_loads()
+    posts: dict[int, dict] = {}
+    for idx, json_line in enumerate(iter_repack_file_records(BASE_REPACK_PATH / rel_path)):
+        if idx in offsets:
+            post_data = loads(json_line)
+            posts[idx] = post_data["data"] if "data" in post_data else post_data
+        if idx == last_offset:
+            break
+    return posts
 
 
 class RandomPackedDataIterator(BaseIterator):
@@ -24,64 +42,89 @@ class RandomPackedDataIterator(BaseIterator):
 
         repack_db =  BASE_STAT_PATH / "repack_stats.db"
         if not repack_db.exists():
-            print("no repack stats db found")
-            sys.exit(1)
+            raise FileNotFoundError(f"no repack stats db found: {repack_db}")
 
         engine = create_engine(f'sqlite:///{repack_db}')
         self.session_maker= sessionmaker(engine)
         self.session = None
+        # prefix sums of the counts of the files of the language, loaded once. draws are resolved with bisect
+        self.language = list(self.settings.languages)[0]
+        self.total_indices = array("q")
+        self.paths: list[str] = []
         with self.session_maker() as session:
-            last_entry = session.execute(
-                select(RepackStats).order_by(RepackStats.id.desc()).limit(1)
-            ).scalar_one_or_none()
-            self.max_index = last_entry.total_index + last_entry.count
-            # print(self.max_index)
+            entries = session.execute(
+                select(RepackStats.total_index, RepackStats.count, RepackStats.path)
+                .where(RepackStats.language == self.language)
+                .where(RepackStats.count > 0)
+                .order_by(RepackStats.total_index)
+            ).all()
+        for total_index, count, path in entries:
+            self.total_indices.append(total_index)
+            self.paths.append(path)
+        self.max_index = entries[-1].total_index + entries[-1].count if entries else 0
+        if not self.max_index:
+            raise ValueError(f"no repack stats for language: {self.language}")
 
     def __iter__(self):
         return self
 
-    def get_file_and_index(self) -> Optional[tuple[str, int, int]]:
-        random_index = random.randint(0, self.max_index - 1)
-        # print(f"Random index: {random_index}")
-        # print(random_index)
-        with self.session_maker() as session:
-            entry = session.execute(
-                select(RepackStats)
-                .where(RepackStats.language == list(self.settings.languages)[0])
-                .where(RepackStats.total_index <= random_index)
-                .where(RepackStats.total_index + RepackStats.count > random_index)
-            ).scalar()
-
-            if entry:
-                offset = random_index - entry.total_index
-                return entry.path, offset, random_index
+    def resolve_index(self, random_index: int) -> tuple[str, int]:
+        """
+        file (relative path) and the offset of a post in it, for an index over all posts of the language
+        """
+        file_idx = bisect_right(self.total_indices, random_index) - 1
+        return self.paths[file_idx], random_index - self.total_indices[file_idx]
 
-            return
+    def get_files_and_indices(self, k: int) -> list[tuple[str, int, int]]:
+        """
+        draw k random posts
+        :return: (relative path, offset, random index) for each draw
+        """
+        return [(*self.resolve_index(random_index), random_index)
+                for random_index in (random.randrange(self.max_index) for _ in range(k))]
 
-    def __next__(self):
-        find = self.get_file_and_index()
-        if not find:
-            print("strange, no entry...")
-            return None
-        rel_path, index,random_index = find
-        fp = BASE_REPACK_PATH / rel_path
-        # file_data = read_gzip_file(fp)
-        post_data: dict = None
-        all_lines = []
-        for idx, json_line in enumerate(iter_jsonl_data2(fp)):
-            if idx == index -1 :
-                post_data = json.loads(json_line)
-                break
-            all_lines.append(json_line)
+    def get_file_and_index(self) -> Optional[tuple[str, int, int]]:
+        return self.get_files_and_indices(1)[0]
 
+    def _pass_methods(self, post_data: dict) -> bool:
         for method in self.methods:
-            if not post_data:
-                post_data = json.loads(all_lines[-1])
             res = method.process_data(post_data, None)
             if isinstance(res, ProcessCancel):
-                return None
+                return False
+        return True
+
+    def sample_posts(self, k: int) -> list[tuple[str, int, dict, int]]:
+        """
+        draw k random posts and read each file that is hit only once.
+        Posts that are canceled by a method are dropped
+        :return: (relative path, offset, post, random index) in the order of the draws
+        """
+        draws = self.get_files_and_indices(k)
+        file_offsets: dict[str, list[int]] = {}
+        for rel_path, offset, _ in draws:
+            file_offsets.setdefault(rel_path, []).append(offset)
+        file_posts = {rel_path: read_repack_file_posts(rel_path, offsets)
+                      for rel_path, offsets in sorted(file_offsets.items())}
 
-        return rel_path, index, post_data,random_index
+        samples = []
+        for rel_path, offset, random_index in draws:
+            post_data = file_posts[rel_path].get(offset)
+            if post_data is None:
+                print(f"strange, no post {offset} in {rel_path}")
+                continue
+            if self._pass_methods(post_data):
+                samples.append((rel_path, offset, post_data, random_index))
+        return samples
+
+    def __next__(self):
+        rel_path, offset, random_index = self.get_file_and_index()
+        post_data = read_repack_file_posts(rel_path, [offset]).get(offset)
+        if not post_data:
+            print("strange, no entry...")
+            return None
+        if not self._pass_methods(post_data):
+            return None
+        return rel_path, offset, post_data, random_index
 
     def __del__(self):
         # Ensure the session is closed when the object is garbage collected
@@ -1,15 +1,19 @@
-import io
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Any, Type, Iterable
 
-from jsonlines import jsonlines
 from tqdm import tqdm
 
-from src.consts import BASE_REPACK_PATH, get_logger, locationindex_type
+from src.consts import BASE_REPACK_PATH, get_logger, locationindex_type, CONFIG
+from src.db.db import dispose_engines
+from src.json_decoder import get_loads
 from src.models import IterationSettings, ProcessCancel
-from src.process_methods.abstract_method import IterationMethod
+from src.process_methods.abstract_method import IterationMethod, method_definitions, create_worker_methods, \
+    process_batch_with_methods
 from src.status import MonthDatasetStatus
-from src.util import year_month_str, read_gzip_file
+from src.repack_format import iter_repack_file_records, is_repack_file
+from src.util import year_month_str, prefetch
 
 logger = get_logger(__file__, "INFO")
 
@@ -22,6 +26,8 @@ class RepackedDataIterator:
         self.settings = settings
         self.status = status
         self.methods = methods
+        # pass whole files to the methods, if they all can process batches
+        self.batch_mode = bool(methods) and all(method.supports_batch() for method in methods)
 
         ym_str = year_month_str(settings.year, settings.month)
         self.base_month_path = BASE_REPACK_PATH / ym_str
@@ -42,36 +48,110 @@ class RepackedDataIterator:
                 break
         return None
 
-    def _repack_file_iterator(self, jsonl_file_data: bytes, location_index: list[str]):
-        for idx, jsonl_entry in enumerate(jsonlines.Reader(io.BytesIO(jsonl_file_data))):
+    def _repack_file_batch_iterator(self, jsonl_lines: Iterable[bytes], location_index: list[str]):
+        """
+        decode the whole file and pass it as one batch through the methods
+        """
+        loads = get_loads()
+        posts: list[dict] = []
+        location_indices: list[locationindex_type] = []
+        for idx, jsonl_line in enumerate(jsonl_lines):
+            jsonl_entry = loads(jsonl_line)
+            posts.append(jsonl_entry["data"] if "data" in jsonl_entry else jsonl_entry)
+            location_indices.append(locationindex_type((*location_index, str(idx))))
+        process_batch_with_methods(self.methods, posts, location_indices)
+
+    def _repack_file_iterator(self, jsonl_lines: Iterable[bytes], location_index: list[str]):
+        if self.batch_mode:
+            self._repack_file_batch_iterator(jsonl_lines, location_index)
+            return
+        loads = get_loads()
+        for idx, jsonl_line in enumerate(jsonl_lines):
+            jsonl_entry = loads(jsonl_line)
             # language and original tweet filter
             location_index.append(str(idx))
             self._repack_jsonl_line_processor(jsonl_entry, location_index)
             location_index.pop()
 
+    def _repack_day_lang_iterator(self, day_path: Path, lang: str, location_index: list[str]):
+        lang_path: Path = day_path / lang
+        lang_day_files = sorted(file for file in lang_path.glob("*") if is_repack_file(file))
+        files_lines = ((file, iter_repack_file_records(file)) for file in lang_day_files)
+        if CONFIG.PREFETCH_QUEUE_DEPTH:
+            # the files are read and decompressed completely in the background thread
+            files_lines = prefetch(((file, list(file_lines)) for file, file_lines in files_lines),
+                                   CONFIG.PREFETCH_QUEUE_DEPTH)
+        for file, file_lines in tqdm(files_lines, total=len(lang_day_files)):
+            location_index.extend([lang_path.parent.name, lang])
+            self._repack_file_iterator(file_lines, location_index)
+            location_index.pop()
+            location_index.pop()
+
     def _repack_day_iterator(self, day_path: Path, location_index: list[str]):
         for lang in self.settings.languages:
-            lang_path: Path = day_path / lang
-            lang_day_files = sorted(lang_path.glob("*"))
-            for file in tqdm(lang_day_files):
-                location_index.extend([lang_path.parent.name, lang])
-                self._repack_file_iterator(read_gzip_file(file), location_index)
-                location_index.pop()
-                location_index.pop()
+            self._repack_day_lang_iterator(day_path, lang, location_index)
+
+    def _month_location_index(self) -> list[str]:
+        return [f"repack-{year_month_str(self.settings.year, self.settings.month)}"]
 
     def repack_month_iterator(self):
         days_dirs = sorted(self.base_month_path.glob("*"))
-        location_index: list[str] = [f"repack-{year_month_str(self.settings.year, self.settings.month)}"]
+        location_index: list[str] = self._month_location_index()
         for idx, days_dir in enumerate(days_dirs):
             print(f"{idx + 1} / {len(days_dirs)}")
             self._repack_day_iterator(days_dir, location_index)
 
+    def repack_month_parallel_iterator(self, num_workers: int):
+        """
+        distributes the (day, language) partitions to worker processes, with their own method instances
+        and merges the partial results into the methods, in the order of the partitions
+        """
+        partitions = [(days_dir, lang)
+                      for days_dir in sorted(self.base_month_path.glob("*"))
+                      for lang in sorted(self.settings.languages)]
+        method_defs = method_definitions(self.methods)
+        # the workers must not reuse the db connections of this process
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 initializer=dispose_engines,
+                                 initargs=(False,)) as executor:
+            results = executor.map(_repack_partition_worker,
+                                   repeat(self.settings),
+                                   repeat(method_defs),
+                                   [days_dir for days_dir, _ in partitions],
+                                   [lang for _, lang in partitions])
+            for idx, ((days_dir, lang), partials) in enumerate(zip(partitions, results)):
+                print(f"{idx + 1} / {len(partitions)}: {days_dir.name} {lang}")
+                for method, partial in zip(self.methods, partials):
+                    method.merge(partial)
+
+
+def _repack_partition_worker(settings: IterationSettings,
+                             method_defs: list[tuple[Type[IterationMethod], Any]],
+                             day_path: Path,
+                             lang: str) -> list[Any]:
+    """
+    runs in a worker process. processes one day/language partition of the repack with its own method instances
+    and returns their partial results
+    """
+    methods = create_worker_methods(settings, method_defs, f"{day_path.name}-{lang}")
+    d_iterator = RepackedDataIterator(settings, None, methods)
+    d_iterator._repack_day_lang_iterator(day_path, lang, d_iterator._month_location_index())
+    return [method.partial_result() for method in methods]
+
 
 def repack_iterator(settings: IterationSettings,
                     status: Optional[MonthDatasetStatus],
                     methods: list[IterationMethod]):
     d_iterator = RepackedDataIterator(settings, status, methods)
-    d_iterator.repack_month_iterator()
+    if CONFIG.NUM_WORKERS > 1:
+        not_parallel = [method.name() for method in methods if not method.parallel_safe()]
+        if not_parallel:
+            logger.warning(f"methods {not_parallel} cannot run in parallel. Falling back to a single process")
+            d_iterator.repack_month_iterator()
+        else:
+            d_iterator.repack_month_parallel_iterator(CONFIG.NUM_WORKERS)
+    else:
+        d_iterator.repack_month_iterator()
 
     # for method in methods:
     #     if status:
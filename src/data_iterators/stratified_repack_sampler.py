@@ -0,0 +1,169 @@
+"""
+Stratified sampling of posts over the repack, with the file counts of the repack stats (see src/helper/repack_stats.py).
+Draws k posts per stratum (language/day/hour or language/day) and only reads the lines needed,
+each file once per round, instead of iterating the whole month (like AnnotPostCollection does).
+Files (buckets) that only have posts in the first `skip_minutes` of an hour are not sampled, posts of other files
+in these minutes are dropped and redrawn.
+"""
+import random
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import select
+
+from src.consts import locationindex_type, logger
+from src.data_iterators.random_repack_iterator import read_repack_file_posts
+from src.db.db import init_db, main_db_path
+from src.helper.repack_stats import RepackStats, setup_db
+from src.models import IterationSettings
+from src.process_methods.annotation_db_method import AnnotPostCollection
+from src.util import post_date2, year_month_str
+
+
+class StratifiedSamplerConfig(BaseModel):
+    posts_per_stratum: int = 1
+    stratum: Literal["hour", "day"] = "hour"
+    # we noticed that the first posts for each hour are often automated
+    skip_minutes: int = 0
+    seed: Optional[int] = None
+
+    model_config = ConfigDict(extra='ignore')
+
+
+# (language, day, hour). hour is 0 for stratum: day
+StratumKey = tuple[str, int, int]
+
+
+@dataclass
+class Stratum:
+    key: StratumKey
+    # prefix sums of the counts of the files in the stratum
+    total_indices: array = field(default_factory=lambda: array("q"))
+    paths: list[str] = field(default_factory=list)
+    size: int = 0
+    drawn: set[int] = field(default_factory=set)
+    # (relative path, offset, post)
+    samples: list[tuple[str, int, dict]] = field(default_factory=list)
+
+    def add_file(self, path: str, count: int):
+        self.total_indices.append(self.size)
+        self.paths.append(path)
+        self.size += count
+
+    def exhausted(self) -> bool:
+        return len(self.drawn) == self.size
+
+    def draw(self, rnd: random.Random, k: int) -> list[tuple[str, int]]:
+        """
+        draw up to k indices, that were not drawn before
+        :return: (relative path, offset) of the draws
+        """
+        draws = []
+        while len(draws) < k and not self.exhausted():
+            index = rnd.randrange(self.size)
+            if index in self.drawn:
+                continue
+            self.drawn.add(index)
+            file_idx = bisect_right(self.total_indices, index) - 1
+            draws.append((self.paths[file_idx], index - self.total_indices[file_idx]))
+        return draws
+
+
+class StratifiedRepackSampler:
+
+    def __init__(self, settings: IterationSettings, config: StratifiedSamplerConfig):
+        self.settings = settings
+        self.config = config
+        self.rnd = random.Random(config.seed)
+        self.strata: dict[StratumKey, Stratum] = {}
+        self._load_strata()
+
+    def _stratum_key(self, language: str, dt: datetime) -> StratumKey:
+        return language, dt.day, dt.hour if self.config.stratum == "hour" else 0
+
+    def _load_strata(self):
+        with setup_db(reset=False)() as session:
+            entries = session.execute(
+                select(RepackStats.language, RepackStats.dt, RepackStats.path, RepackStats.count)
+                .where(RepackStats.year == self.settings.year)
+                .where(RepackStats.month == self.settings.month)
+                .where(RepackStats.language.in_(self.settings.languages))
+                .where(RepackStats.count > 0)
+                .order_by(RepackStats.language, RepackStats.dt)
+            ).all()
+        if not entries:
+            logger.warning(f"no repack stats for {year_month_str(self.settings.year, self.settings.month)}")
+        for idx, (language, dt, path, count) in enumerate(entries):
+            next_entry = entries[idx + 1] if idx + 1 < len(entries) else None
+            next_dt = next_entry.dt if next_entry and next_entry.language == language else None
+            if self._in_skipped_minutes(dt, next_dt):
+                continue
+            key = self._stratum_key(language, dt)
+            self.strata.setdefault(key, Stratum(key)).add_file(path, count)
+
+    def _in_skipped_minutes(self, bucket_dt: datetime, next_bucket_dt: Optional[datetime]) -> bool:
+        """
+        if the posts of a bucket (until the next bucket of the language) are all in the skipped minutes of the hour
+        """
+        if next_bucket_dt is None:
+            return False
+        return bucket_dt.minute + (next_bucket_dt - bucket_dt).total_seconds() / 60 <= self.config.skip_minutes
+
+    def _accept(self, post_data: dict) -> bool:
+        return post_date2(post_data).minute >= self.config.skip_minutes
+
+    def sample(self) -> dict[StratumKey, list[tuple[str, int, dict]]]:
+        """
+        draw posts_per_stratum posts of each stratum (less, if the stratum does not have enough posts).
+        Rejected posts are redrawn in the next round
+        :return: (relative path, offset, post) for each stratum
+        """
+        k = self.config.posts_per_stratum
+        while True:
+            file_draws: dict[str, list[tuple[Stratum, int]]] = {}
+            for stratum in self.strata.values():
+                for path, offset in stratum.draw(self.rnd, k - len(stratum.samples)):
+                    file_draws.setdefault(path, []).append((stratum, offset))
+            if not file_draws:
+                break
+            for path, draws in sorted(file_draws.items()):
+                posts = read_repack_file_posts(path, [offset for _, offset in draws])
+                for stratum, offset in draws:
+                    post_data = posts.get(offset)
+                    if post_data and self._accept(post_data):
+                        stratum.samples.append((path, offset, post_data))
+
+        for stratum in self.strata.values():
+            if len(stratum.samples) < k:
+                logger.warning(f"stratum {stratum.key}: only {len(stratum.samples)} posts")
+        return {key: stratum.samples for key, stratum in sorted(self.strata.items())}
+
+    def location_index(self, rel_path: str, offset: int) -> locationindex_type:
+        """
+        like the location index of the repack iterator (repack-month, day, language, line), but with the
+        file of the line: (repack-month, day, language/file, line)
+        """
+        month_str, day_str, lang_file = rel_path.split("/", 2)
+        return locationindex_type((f"repack-{month_str}", day_str, lang_file, str(offset)))
+
+    def create_annotation_dbs(self, samples: Optional[dict[StratumKey, list[tuple[str, int, dict]]]] = None):
+        """
+        store the samples (drawn if not given) in the annotation dbs of the languages
+        (like AnnotationDBMethod does)
+        """
+        samples = samples if samples is not None else self.sample()
+        for lang in self.settings.languages:
+            with init_db(main_db_path(self.settings.year,
+                                      self.settings.month,
+                                      lang,
+                                      self.settings.annotation_extra))() as session:
+                for (stratum_lang, _, _), stratum_samples in samples.items():
+                    if stratum_lang != lang:
+                        continue
+                    for rel_path, offset, post_data in stratum_samples:
+                        session.add(AnnotPostCollection.create_annot1(post_data, self.location_index(rel_path, offset)))
+                session.commit()
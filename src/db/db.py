@@ -3,12 +3,12 @@ from pathlib import Path
 from typing import Optional, Type
 
 from deprecated.classic import deprecated
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, Engine, Connection, event
 from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import create_database
 
-from src.consts import logger, ANNOTATION_DB, BASE_DBS_PATH
+from src.consts import logger, ANNOTATION_DB, BASE_DBS_PATH, CONFIG
 from src.db.models import Base, DBAnnot1Post
 from src.models import SingleLanguageSettings
 
@@ -51,27 +51,96 @@ def init_db(db_path: Path, read_only: bool = False,
     :param read_only: DB MUST EXIST
     :return:
     """
+    return sessionmaker(init_db_engine(db_path, read_only, new, tables))
+
+
+# (resolved db path, read only) -> engine
+_engines: dict[tuple[Path, bool], Engine] = {}
+
+
+def _set_sqlite_pragmas(read_only: bool):
+    def on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # readers do not block the writer (and the other way around)
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA mmap_size={CONFIG.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA cache_size=-{CONFIG.SQLITE_CACHE_SIZE_MB * 1024}")
+        cursor.execute(f"PRAGMA busy_timeout={CONFIG.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    return on_connect
+
+
+def init_db_engine(db_path: Path, read_only: bool = False,
+                   new: bool = False, tables: Optional[set[Type[DeclarativeBase]]] = None) -> Engine:
+    """
+    the engine of a db (created with the tables, if it does not exist). see init_db
+    Engines are cached for the process, for each db path and read only mode.
+    :param read_only: opens the db file in read only mode. DB MUST EXIST
+    """
     # ask for removal of db file, if config is True
     if new and db_path.exists():
         raise Exception(f"DB already exists: {db_path}")
 
-    db_uri = db_path.as_posix()
+    if read_only and not db_path.exists():
+        raise FileNotFoundError(f"DB file does not exist: {db_path.as_posix()}")
+
+    engine_key = (db_path.resolve(), read_only)
+    engine = _engines.get(engine_key)
+    if engine is not None:
+        if db_path.exists():
+            return engine
+        # the file was deleted. a new db is created
+        engine.dispose()
+        del _engines[engine_key]
+
     if read_only:
-        pass  # todo did not work, but added ?mode=ro to name
-        # db_uri += "?mode=ro&uri=true"
-        if not Path(db_uri).exists():
-            raise FileNotFoundError(f"DB file does not exist: {db_uri}")
+        db_url = f"sqlite:///file:{db_path.resolve().as_posix()}?mode=ro&uri=true"
+    else:
+        db_url = f"sqlite:///{db_path.as_posix()}"
+    engine = create_engine(db_url, pool_size=CONFIG.SQLITE_POOL_SIZE)
+    event.listen(engine, "connect", _set_sqlite_pragmas(read_only))
 
-    engine = create_engine(f'sqlite:///{db_uri}')
     if not db_path.exists():
         create_database(engine.url)
-        logger.info(f"creating db: {db_path.relative_to(BASE_DBS_PATH)}")
+        log_path = db_path.relative_to(BASE_DBS_PATH) if db_path.is_relative_to(BASE_DBS_PATH) else db_path
+        logger.info(f"creating db: {log_path}")
         if tables:
             Base.metadata.create_all(engine, tables=[cls.__table__ for cls in tables])
         else:
             Base.metadata.create_all(engine)
 
-    return sessionmaker(engine)
+    _engines[engine_key] = engine
+    return engine
+
+
+def dispose_engines(close: bool = True):
+    """
+    close the connections of all cached engines (e.g. before deleting db files)
+    :param close: False in forked worker processes (initializer of the executor), so that they do not reuse
+    the connections of the parent process and do not close them either
+    """
+    for engine in _engines.values():
+        engine.dispose(close=close)
+    _engines.clear()
+
+
+def set_bulk_load_pragmas(connection: Connection, cache_size_mb: int = 256):
+    """
+    sqlite settings for loading many rows over one connection (in addition to the ones of all connections):
+    no syncs to disk (a crash during the load can corrupt the db) and a larger page cache
+    """
+    connection.exec_driver_sql("PRAGMA synchronous=OFF")
+    connection.exec_driver_sql(f"PRAGMA cache_size=-{cache_size_mb * 1024}")
+
+
+def end_bulk_load(connection: Connection):
+    """
+    reset the syncs and write the write ahead log into the db
+    """
+    connection.exec_driver_sql("PRAGMA synchronous=FULL")
+    connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
 
 
 def strict_init_annot_db_get_session(db_path: Path) -> Session:
@@ -0,0 +1,100 @@
+"""
+Compact storage of location indices (dump, tar file, member, line) in the index dbs.
+The (dump, tar, member) part is stored once in the location_member table and the rows store
+a packed 64 bit key: member id << 32 | line.
+All lines of a member are in the key range of `member_key_range`, so lookups by member are integer range scans.
+"""
+from typing import Union
+
+from sqlalchemy import Connection, select, and_, ColumnElement
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from src.consts import locationindex_type
+from src.db.models import DBLocationMember, DBPostIndexPost
+
+LINE_BITS = 32
+LINE_MASK = (1 << LINE_BITS) - 1
+
+# (dump, tar, member)
+MemberKey = tuple[str, str, str]
+
+
+def pack_location_key(member_id: int, line: int) -> int:
+    if not 0 <= line <= LINE_MASK:
+        raise ValueError(f"line out of range: {line}")
+    return (member_id << LINE_BITS) | line
+
+
+def unpack_location_key(location_key: int) -> tuple[int, int]:
+    """
+    :return: member id, line
+    """
+    return location_key >> LINE_BITS, location_key & LINE_MASK
+
+
+def member_key_range(member_id: int) -> tuple[int, int]:
+    """
+    the location keys of a member are: start <= key < end
+    """
+    return member_id << LINE_BITS, (member_id + 1) << LINE_BITS
+
+
+def member_filter(member_id: int) -> ColumnElement[bool]:
+    """
+    where clause for the index entries of a member
+    """
+    start, end = member_key_range(member_id)
+    return and_(DBPostIndexPost.location_key >= start, DBPostIndexPost.location_key < end)
+
+
+class LocationMembers:
+    """
+    cache of the location_member table of a db.
+    The ids of new members are allocated in the db (and committed right away), so that all writers of a db
+    (e.g. the index db and full post methods) use the same ids
+    """
+
+    def __init__(self, connection: Union[Connection, Session]):
+        self.connection = connection
+        self._ids: dict[MemberKey, int] = {}
+        self._members: dict[int, MemberKey] = {}
+        for member in connection.execute(select(DBLocationMember.__table__)):
+            self._add(member.id, (member.dump, member.tar, member.member))
+
+    def _add(self, member_id: int, member_key: MemberKey):
+        self._ids[member_key] = member_id
+        self._members[member_id] = member_key
+
+    def member_id(self, dump: str, tar: str, member: str) -> int:
+        member_key = (dump, tar, member)
+        member_id = self._ids.get(member_key)
+        if member_id is None:
+            self.connection.execute(insert(DBLocationMember).values(dump=dump, tar=tar, member=member)
+                                    .on_conflict_do_nothing())
+            member_id = self.connection.execute(
+                select(DBLocationMember.id).where(DBLocationMember.dump == dump,
+                                                  DBLocationMember.tar == tar,
+                                                  DBLocationMember.member == member)
+            ).scalar_one()
+            self.connection.commit()
+            self._add(member_id, member_key)
+        return member_id
+
+    def location_key(self, location_index: locationindex_type) -> int:
+        dump, tar, member, line = location_index
+        return pack_location_key(self.member_id(dump, tar, member), int(line))
+
+    def location_index(self, location_key: int) -> locationindex_type:
+        """
+        :raises KeyError: if the member is not in the db
+        """
+        member_id, line = unpack_location_key(location_key)
+        if member_id not in self._members:
+            # added by another writer of the db
+            member = self.connection.execute(
+                select(DBLocationMember.__table__).where(DBLocationMember.id == member_id)).one_or_none()
+            if member is None:
+                raise KeyError(member_id)
+            self._add(member.id, (member.dump, member.tar, member.member))
+        return locationindex_type((*self._members[member_id], line))
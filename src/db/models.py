@@ -1,7 +1,8 @@
 from datetime import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import String, DateTime, JSON, SmallInteger, func, Integer, Boolean, Enum
+from sqlalchemy import String, DateTime, JSON, SmallInteger, func, Integer, Boolean, Enum, BigInteger, \
+    UniqueConstraint, LargeBinary, ForeignKey
 from sqlalchemy.orm import DeclarativeMeta, declarative_base, Mapped, mapped_column
 
 Base: DeclarativeMeta = declarative_base()
@@ -24,6 +25,18 @@ class Annot1Corine(PyEnum):
     AMBIGUOUS = "am"
 
 
+class DBLocationMember(Base):
+    """
+    the (dump, tar file, member) part of the location indices. see src/db/location_index.py
+    """
+    __tablename__ = 'location_member'
+    __table_args__ = (UniqueConstraint("dump", "tar", "member"),)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    dump: Mapped[str] = mapped_column(String(20), nullable=False)
+    tar: Mapped[str] = mapped_column(String(20), nullable=False)
+    member: Mapped[str] = mapped_column(String(60), nullable=False)
+
+
 class DBPostIndexPost(Base):
     __tablename__ = 'postindex'
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -31,7 +44,9 @@ class DBPostIndexPost(Base):
     post_url_computed: Mapped[str] = mapped_column(String(60), nullable=False,
                                                    unique=False)  # todo, take proper user as path variable
     date_created: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    location_index: Mapped[list] = mapped_column(JSON, nullable=False)
+    # location member id and line, packed (see src/db/location_index.py)
+    # indexes are created after loading (see src/db/post_index_query.py)
+    location_key: Mapped[int] = mapped_column(BigInteger, nullable=False)
     language: Mapped[str] = mapped_column(String(5), nullable=False)
 
     year_created: Mapped[int] = mapped_column(SmallInteger, nullable=False)
@@ -46,6 +61,40 @@ class DBPostIndexPost(Base):
         self.hour_created = self.date_created.hour
 
 
+class DBCompressionDictionary(Base):
+    """
+    dictionaries for the compression of the full post contents. see src/db/post_compression.py
+    """
+    __tablename__ = 'compression_dictionary'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    compression: Mapped[str] = mapped_column(String(10), nullable=False)
+    # empty: no dictionary
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class DBFullPost(Base):
+    """
+    complete posts with their content compressed (written by FullPostDBMethod)
+    """
+    __tablename__ = 'full_post'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    platform_id: Mapped[str] = mapped_column(String(50), nullable=False)
+    post_url_computed: Mapped[str] = mapped_column(String(60), nullable=False)
+    date_created: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    language: Mapped[str] = mapped_column(String(5), nullable=False)
+    # location member id and line, packed (see src/db/location_index.py)
+    location_key: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(String, nullable=True)
+    # compressed json of the post
+    content: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    dictionary_id: Mapped[int] = mapped_column(ForeignKey("compression_dictionary.id"), nullable=False)
+
+    year_created: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    month_created: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    day_created: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    hour_created: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+
 class DBPost(Base):
     __tablename__ = 'post'
 
@@ -0,0 +1,140 @@
+"""
+Compression of the full post contents (DBFullPost.content) with a dictionary, that is trained on posts of the db.
+Short json documents with the same keys compress much better with a dictionary.
+zstd (trained dictionary), if zstandard is installed. Otherwise, zlib with a preset dictionary (the end of the samples).
+The dictionaries are stored in the compression_dictionary table of the db, the rows reference them.
+"""
+import zlib
+from typing import Literal, Optional, Generator, Union
+
+from sqlalchemy import Connection, select, insert
+from sqlalchemy.orm import Session
+
+from src.consts import logger
+from src.db.models import DBCompressionDictionary, DBFullPost
+from src.json_decoder import get_loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PostCompression = Literal["zstd", "zlib"]
+
+# zlib only uses the last 32KB of a dictionary
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+
+def available_compression(compression: PostCompression) -> PostCompression:
+    """
+    the compression to use. falls back to zlib, if zstandard is not installed
+    """
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed. Compressing posts with zlib")
+        return "zlib"
+    return compression
+
+
+def train_dictionary(compression: PostCompression, samples: list[bytes], dictionary_size: int) -> bytes:
+    """
+    a dictionary from sample posts. empty, if the samples are not enough
+    """
+    if not samples:
+        return b""
+    if compression == "zstd":
+        try:
+            return zstandard.train_dictionary(dictionary_size, samples).as_bytes()
+        except zstandard.ZstdError as err:
+            logger.warning(f"could not train a zstd dictionary on {len(samples)} posts: {err}")
+            return b""
+    return b"".join(samples)[-min(dictionary_size, ZLIB_DICTIONARY_SIZE):]
+
+
+class PostCompressor:
+
+    def __init__(self, compression: PostCompression, dictionary: bytes, level: Optional[int] = None):
+        self.compression = compression
+        self.dictionary = dictionary
+        if compression == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._zstd = zstandard.ZstdCompressor(level=3 if level is None else level, dict_data=dict_data)
+        self.level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+
+    def compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._zstd.compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return compressor.compress(data) + compressor.flush()
+
+
+class PostDecompressor:
+
+    def __init__(self, compression: PostCompression, dictionary: bytes):
+        self.compression = compression
+        self.dictionary = dictionary
+        if compression == "zstd":
+            if zstandard is None:
+                raise ImportError("zstandard is required to decompress zstd posts")
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._zstd = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._zstd.decompress(data)
+        if self.dictionary:
+            return zlib.decompressobj(zdict=self.dictionary).decompress(data)
+        return zlib.decompress(data)
+
+
+def store_dictionary(connection: Connection, compression: PostCompression, dictionary: bytes) -> int:
+    """
+    :return: the id of the dictionary
+    """
+    return connection.execute(
+        insert(DBCompressionDictionary).values(compression=compression, data=dictionary)
+        .returning(DBCompressionDictionary.id)
+    ).scalar_one()
+
+
+def load_dictionary(connection: Union[Connection, Session], dictionary_id: int) -> tuple[PostCompression, bytes]:
+    """
+    :return: compression and data of a dictionary
+    """
+    compression, data = connection.execute(
+        select(DBCompressionDictionary.compression, DBCompressionDictionary.data)
+        .where(DBCompressionDictionary.id == dictionary_id)
+    ).one()
+    return compression, data
+
+
+class FullPostReader:
+    """
+    decodes the contents of full posts, with the dictionaries of the db
+    """
+
+    def __init__(self, connection: Union[Connection, Session]):
+        self.connection = connection
+        self._decompressors: dict[int, PostDecompressor] = {}
+        self._loads = get_loads()
+
+    def _decompressor(self, dictionary_id: int) -> PostDecompressor:
+        if dictionary_id not in self._decompressors:
+            self._decompressors[dictionary_id] = PostDecompressor(*load_dictionary(self.connection, dictionary_id))
+        return self._decompressors[dictionary_id]
+
+    def decode(self, content: bytes, dictionary_id: int) -> dict:
+        return self._loads(self._decompressor(dictionary_id).decompress(content))
+
+    def post_data(self, full_post: DBFullPost) -> dict:
+        return self.decode(full_post.content, full_post.dictionary_id)
+
+    def iter_posts(self, *where) -> Generator[dict, None, None]:
+        """
+        decoded posts, e.g. iter_posts(DBFullPost.hour_created == 3)
+        """
+        for content, dictionary_id in self.connection.execute(
+                select(DBFullPost.content, DBFullPost.dictionary_id).where(*where).order_by(DBFullPost.id)):
+            yield self.decode(content, dictionary_id)
@@ -0,0 +1,64 @@
+"""
+Indexes and time range queries of the post index dbs (DBPostIndexPost, written by IndexEntriesDB).
+The indexes are not part of the table definition, but created after the bulk load (create_post_index_indexes),
+so loading does not update them for every row.
+"""
+from datetime import datetime
+from typing import Generator
+
+from sqlalchemy import Connection, select
+from sqlalchemy.orm import Session
+
+from src.consts import locationindex_type
+from src.db.db import init_db, main_db_path
+from src.db.location_index import LocationMembers
+from src.db.models import DBPostIndexPost
+from src.pick_data import grab_posts
+
+POST_INDEX_INDEXES: dict[str, str] = {
+    "ix_postindex_language_date": "postindex (language, date_created)",
+    "ix_postindex_hour": "postindex (year_created, month_created, day_created, hour_created)",
+    "ix_postindex_location_key": "postindex (location_key)",
+}
+
+
+def create_post_index_indexes(connection: Connection):
+    """
+    create the indexes of the postindex table, if they do not exist (commits)
+    """
+    for name, columns in POST_INDEX_INDEXES.items():
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    connection.commit()
+
+
+def location_indices_in_range(session: Session,
+                              language: str,
+                              start: datetime,
+                              end: datetime) -> list[locationindex_type]:
+    """
+    location indices of the posts of a language with start <= date_created < end.
+    Sorted by tar file, member and line (the order of the packed location keys)
+    """
+    location_keys = session.execute(
+        select(DBPostIndexPost.location_key)
+        .where(DBPostIndexPost.language == language)
+        .where(DBPostIndexPost.date_created >= start)
+        .where(DBPostIndexPost.date_created < end)
+        .order_by(DBPostIndexPost.location_key)
+    ).scalars().all()
+    members = LocationMembers(session)
+    return [members.location_index(location_key) for location_key in location_keys]
+
+
+def posts_in_range(year: int, month: int,
+                   language: str,
+                   start: datetime,
+                   end: datetime,
+                   annotation_extra: str = "",
+                   workers: int = 1) -> Generator[dict, None, None]:
+    """
+    the posts of a language in a time range, read from the dump with the index db of the month
+    """
+    with init_db(main_db_path(year, month, language, annotation_extra), read_only=True)() as session:
+        location_indices = location_indices_in_range(session, language, start, end)
+    yield from grab_posts(location_indices, workers)
@@ -0,0 +1,97 @@
+"""
+rows/sec of writing post index entries (see src/process_methods/index_db_method.py):
+orm objects, flushed every 500 posts with a new session (previous) and core executemany over one connection.
+pass the number of posts (default 200000). The dbs are written into BASE_DBS_PATH/index_benchmark and removed after
+"""
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from src.consts import locationindex_type, BASE_DBS_PATH
+from src.db.db import init_db_engine, set_bulk_load_pragmas, end_bulk_load
+from src.db.location_index import LocationMembers
+from src.db.models import DBPostIndexPost
+from src.process_methods.index_db_method import IndexEntriesDB
+
+
+def create_posts(num_posts: int) -> list[tuple[dict, locationindex_type]]:
+    """
+    posts with the fields that are used for the index entries
+    """
+    posts = []
+    for idx in range(num_posts):
+        post_data = {"id": idx,
+                     "timestamp_ms": str(1641000000000 + idx * 100),
+                     "lang": "en",
+                     "user": {"screen_name": f"user{idx % 1000}"}}
+        location_index = locationindex_type(("2022-01", "20220101", f"20220101/20220101{idx // 10000:06d}.json.gz",
+                                             idx % 10000))
+        posts.append((post_data, location_index))
+    return posts
+
+
+def orm_load(db_path: Path, posts: list[tuple[dict, locationindex_type]]):
+    session_maker = sessionmaker(init_db_engine(db_path))
+    members_session = session_maker()
+    members = LocationMembers(members_session)
+    entries = []
+    for post_data, location_index in posts:
+        entries.append(IndexEntriesDB._create_index_entry(post_data, members.location_key(location_index)))
+        if len(entries) > 500:
+            with session_maker() as session:
+                session.add_all(entries)
+                session.commit()
+                entries.clear()
+    members_session.close()
+    with session_maker() as session:
+        session.add_all(entries)
+        session.commit()
+
+
+def core_load(db_path: Path, posts: list[tuple[dict, locationindex_type]], batch_size: int = 10000):
+    with init_db_engine(db_path).connect() as connection:
+        set_bulk_load_pragmas(connection)
+        members = LocationMembers(connection)
+        rows = []
+        for post_data, location_index in posts:
+            rows.append(IndexEntriesDB._create_index_row(post_data, members.location_key(location_index)))
+            if len(rows) >= batch_size:
+                connection.execute(insert(DBPostIndexPost), rows)
+                connection.commit()
+                rows.clear()
+        if rows:
+            connection.execute(insert(DBPostIndexPost), rows)
+            connection.commit()
+        end_bulk_load(connection)
+
+
+def benchmark(posts: list[tuple[dict, locationindex_type]]) -> dict[str, float]:
+    loaders: dict[str, Callable[[Path, list[tuple[dict, locationindex_type]]], None]] = {
+        "orm (previous)": orm_load,
+        "core executemany": core_load
+    }
+    results: dict[str, float] = {}
+    benchmark_path = BASE_DBS_PATH / "index_benchmark"
+    shutil.rmtree(benchmark_path, ignore_errors=True)
+    benchmark_path.mkdir()
+    try:
+        for idx, (name, loader) in enumerate(loaders.items()):
+            start = time.perf_counter()
+            loader(benchmark_path / f"index_{idx}.sqlite", posts)
+            results[name] = len(posts) / (time.perf_counter() - start)
+    finally:
+        shutil.rmtree(benchmark_path)
+    return results
+
+
+if __name__ == "__main__":
+    num_posts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    posts = create_posts(num_posts)
+    print(f"{num_posts} posts")
+    for name, rows_per_sec in benchmark(posts).items():
+        print(f"{name}: {rows_per_sec:,.0f} rows/sec")
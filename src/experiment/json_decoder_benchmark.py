@@ -0,0 +1,52 @@
+"""
+posts/sec of the json decoder backends (see src/json_decoder.py).
+pass a repacked .jsonl.gz file or a dump .json.gz/.json.bz2 file, otherwise one_post.json is used
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import jsonlines
+
+from src.consts import PROJECT_PATH
+from src.json_decoder import JSON_DECODERS
+from src.util import iter_compressed_lines
+
+
+def load_lines(path: Path) -> list[bytes]:
+    if path.suffix in [".gz", ".bz2"]:
+        with path.open("rb") as fin:
+            return list(iter_compressed_lines(fin, path.name))
+    post = json.load(path.open(encoding="utf-8"))
+    return [json.dumps(post, separators=(",", ":")).encode("utf-8")] * 10000
+
+
+def benchmark(lines: list[bytes], repeat: int = 3) -> dict[str, float]:
+    results: dict[str, float] = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in jsonlines.Reader(lines):
+            pass
+    # jsonlines itself uses orjson or ujson, if installed
+    results["jsonlines (previous)"] = repeat * len(lines) / (time.perf_counter() - start)
+    for name, loads_factory in JSON_DECODERS.items():
+        try:
+            loads = loads_factory()
+        except ImportError:
+            print(f"{name} not installed")
+            continue
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for line in lines:
+                loads(line)
+        results[name] = repeat * len(lines) / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == "__main__":
+    file = Path(sys.argv[1]) if len(sys.argv) > 1 else PROJECT_PATH / "one_post.json"
+    lines = load_lines(file)
+    print(f"{len(lines)} lines from {file}")
+    for backend, posts_per_sec in benchmark(lines).items():
+        print(f"{backend}: {posts_per_sec:,.0f} posts/sec")
@@ -1,12 +1,14 @@
+from dataclasses import dataclass
 from itertools import groupby
+from typing import Iterable
 
-from sqlalchemy import create_engine, Integer, String, select, DateTime
-from sqlalchemy.orm import DeclarativeMeta, declarative_base, sessionmaker, Mapped, mapped_column
-from sqlalchemy_utils import create_database
+from sqlalchemy import create_engine, Integer, String, select, DateTime, delete
+from sqlalchemy.orm import DeclarativeMeta, declarative_base, sessionmaker, Mapped, mapped_column, Session
+from sqlalchemy_utils import create_database, database_exists
 from tqdm import tqdm
 
 from src.consts import BASE_REPACK_PATH, BASE_STAT_PATH
-from src.util import read_gzip_file_and_count_lines
+from src.repack_format import is_repack_file, count_repack_file_records
 
 Base: DeclarativeMeta = declarative_base()
 
@@ -62,33 +64,84 @@ class RepackStats(Base):
     total_index: Mapped[int] = mapped_column(Integer, nullable=True)
 
 
-def setup_db() -> sessionmaker:
+@dataclass
+class RepackFileCount:
+    # relative to BASE_REPACK_PATH
+    path: str
+    language: str
+    dt: datetime
+    count: int
+
+
+def setup_db(reset: bool = True) -> sessionmaker:
     db_path = BASE_STAT_PATH / "repack_stats.db"
-    db_path.unlink(missing_ok=True)
+    if reset:
+        db_path.unlink(missing_ok=True)
     engine = create_engine(f'sqlite:///{db_path}')
-    create_database(engine.url)
+    if not database_exists(engine.url):
+        create_database(engine.url)
     Base.metadata.create_all(engine)
     return sessionmaker(engine)
 
 
+def update_total_indices(session: Session):
+    """
+    set the total_index (running sum of the counts) of all entries, for each language
+    """
+    all_entries = session.execute(
+        select(RepackStats).order_by(RepackStats.language, RepackStats.dt)).scalars().all()
+
+    for lang, entries in groupby(all_entries, key=lambda x: x.language):
+        total_index = 0
+        for e in entries:
+            e.total_index = total_index
+            total_index += e.count
+    session.commit()
+
+
+def store_repack_file_counts(file_counts: Iterable[RepackFileCount]):
+    """
+    store the counts of repack files (written by the repack method) and update the total indices.
+    Existing entries of the same files are replaced
+    """
+    file_counts = [fc for fc in file_counts if fc.count > 0]
+    session_maker = setup_db(reset=False)
+    with session_maker() as session:
+        paths = [fc.path for fc in file_counts]
+        for idx in range(0, len(paths), 500):
+            session.execute(delete(RepackStats).where(RepackStats.path.in_(paths[idx:idx + 500])))
+        session.add_all([RepackStats(
+            year=fc.dt.year,
+            month=fc.dt.month,
+            day=fc.dt.day,
+            hour=fc.dt.hour,
+            minute=fc.dt.minute,
+            path=fc.path,
+            language=fc.language,
+            count=fc.count,
+            dt=fc.dt
+        ) for fc in file_counts])
+        session.commit()
+        update_total_indices(session)
+
+
 def repack_stats_main():
-    gz_files = list(sorted(BASE_REPACK_PATH.glob("**/*.jsonl.gz")))
+    """
+    count the posts of all repack files. The repack method stores them, when it is done, so this is only
+    needed for repacks that were created before
+    """
+    gz_files = list(sorted(file for file in BASE_REPACK_PATH.glob("**/*") if is_repack_file(file)))
     batch_size = 50
     session_maker = setup_db()
 
-    # RETRY WITH ALL LANGUAGES
-
     with session_maker() as session:
         for gz_file in tqdm(gz_files):
             rel_path = gz_file.relative_to(BASE_REPACK_PATH)
-            count = read_gzip_file_and_count_lines(gz_file)
+            count = count_repack_file_records(gz_file)
             if count == 0:
                 continue
             dt = datetime.strptime(gz_file.name.split(".")[0], "%Y%m%d%H%M")
             language = rel_path.parent.name
-            if language != "en":
-                continue
-            # g = Group(year=dt.year,month=dt.month,day=dt.day,)
             session.add(RepackStats(
                 year=dt.year,
                 month=dt.month,
@@ -104,28 +157,8 @@ def repack_stats_main():
                 session.commit()
 
         session.commit()
-
-        all_entries = session.execute(
-            select(RepackStats).order_by(RepackStats.language, RepackStats.dt)).scalars().all()
-
-        grouped_entries = {
-            lang: list(group) for lang, group in groupby(all_entries, key=lambda x: x.language)
-        }
-
-
-        grouped_entries = {
-            "en": grouped_entries["en"]
-        }
-        for entries in grouped_entries.values():
-            total_index = 0
-            for e in entries:
-                e.total_index = total_index
-                total_index += e.count
-                session.add(e)
-            session.commit()
-
+        update_total_indices(session)
 
 
 if __name__ == '__main__':
     repack_stats_main()
-    # pass
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Decoding of the json lines (posts) in the iterators.
+The backend is selected with CONFIG.JSON_DECODER. If it is not installed, the stdlib json is used.
+All backends accept str and bytes lines.
+"""
+import json
+from functools import lru_cache
+from typing import Callable, Any, Union, Optional
+
+from src.consts import CONFIG, logger
+
+JsonLoads = Callable[[Union[str, bytes]], Any]
+
+
+def _json_loads() -> JsonLoads:
+    def loads(line: Union[str, bytes]) -> Any:
+        # json.loads decodes bytes with 'surrogatepass', which is much slower than plain utf-8 decoding
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        return json.loads(line)
+
+    return loads
+
+
+def _orjson_loads() -> JsonLoads:
+    import orjson
+    return orjson.loads
+
+
+def _msgspec_loads() -> JsonLoads:
+    import msgspec
+    return msgspec.json.Decoder().decode
+
+
+JSON_DECODERS: dict[str, Callable[[], JsonLoads]] = {
+    "json": _json_loads,
+    "orjson": _orjson_loads,
+    "msgspec": _msgspec_loads,
+}
+
+
+@lru_cache
+def get_loads(backend: Optional[str] = None) -> JsonLoads:
+    """
+    get the loads function of a backend (default: CONFIG.JSON_DECODER)
+    """
+    backend = backend or CONFIG.JSON_DECODER
+    try:
+        return JSON_DECODERS[backend]()
+    except ImportError:
+        logger.warning(f"json decoder '{backend}' is not installed. Using json")
+        return _json_loads()
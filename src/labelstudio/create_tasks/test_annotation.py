@@ -55,7 +55,7 @@ def create_annotation_label_ds(settings: SingleLanguageSettings,
     """
     specifically for LabelstudioTask
     """
-    session: Session = init_db(main_db_path2(settings))()
+    session: Session = init_db(main_db_path2(settings), read_only=True)()
     posts = session.execute(select(DBAnnot1Post).order_by(DBAnnot1Post.date_created)).scalars().all()
     label_entries = [
         LabelstudioTask(p.text, p.post_url, p.contains_media or False) for p in posts
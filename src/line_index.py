@@ -0,0 +1,150 @@
+"""
+Optional sidecar index of the line offsets in the decompressed jsonl members of a tar file.
+
+With the offsets of a member, a single line (post) is read by seeking in the decompressing stream
+(which stops decompressing after that line) instead of decompressing and splitting the whole member.
+The offsets of a member are stored when the member is decompressed completely (and without errors) the first time
+(or for all members with `build_line_index`).
+Stored in a sqlite db next to the tar index: BASE_TAR_INDEX_PATH/<dump>/<tar>.lines.sqlite
+So with CONFIG.USE_LINE_INDEX, picking posts writes these dbs.
+"""
+import tarfile
+import zlib
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Iterable
+
+from sqlalchemy import String, LargeBinary, select
+from sqlalchemy.orm import DeclarativeMeta, declarative_base, Mapped, mapped_column
+from tqdm import tqdm
+
+from src.consts import BASE_TAR_INDEX_PATH, logger
+from src.db.db import init_db
+from src.tar_index import load_tar_index, TarMember
+from src.util import open_compressed
+
+Base: DeclarativeMeta = declarative_base()
+
+# unsigned 64 bit
+OFFSET_TYPECODE = "Q"
+
+
+class MemberLineOffsets(Base):
+    __tablename__ = 'member_lines'
+    member: Mapped[str] = mapped_column(String, primary_key=True)
+    # array of the start offsets of all lines + the end of the data
+    offsets: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+def line_offsets(data: bytes) -> array:
+    """
+    start offsets of all lines and the length of the data
+    """
+    offsets = array(OFFSET_TYPECODE, [0])
+    pos = data.find(b"\n")
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = data.find(b"\n", pos + 1)
+    if offsets[-1] != len(data):
+        offsets.append(len(data))
+    return offsets
+
+
+class LineIndex:
+    """
+    line offsets of the members of one tar file
+    """
+
+    def __init__(self, tar_file: Path):
+        self.tar_file = tar_file
+        self.tar_index = load_tar_index(tar_file)
+        db_path = BASE_TAR_INDEX_PATH / tar_file.parent.name / f"{tar_file.stem}.lines.sqlite"
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.session_maker = init_db(db_path, tables={MemberLineOffsets})
+
+    def get_offsets(self, member_name: str) -> Optional[array]:
+        with self.session_maker() as session:
+            stored = session.execute(
+                select(MemberLineOffsets.offsets).where(MemberLineOffsets.member == member_name)
+            ).scalar_one_or_none()
+        if stored is None:
+            return None
+        offsets = array(OFFSET_TYPECODE)
+        offsets.frombytes(stored)
+        return offsets
+
+    def store_offsets(self, member_name: str, offsets: array):
+        with self.session_maker() as session:
+            session.merge(MemberLineOffsets(member=member_name, offsets=offsets.tobytes()))
+            session.commit()
+
+    def _decompress_and_index(self, tar: tarfile.TarFile, member: TarMember) -> tuple[bytes, array]:
+        """
+        decompress a member and store its line offsets.
+        The offsets of a member with decompression errors are not stored, only the lines before the error are returned
+        """
+        lines: list[bytes] = []
+        try:
+            with open_compressed(tar.extractfile(member.tarinfo()), member.name) as decompressed:
+                for line in decompressed:
+                    lines.append(line)
+        except (OSError, EOFError, zlib.error) as err:
+            logger.error(f"Error reading {member.name}: {str(err)}. Not storing its line offsets")
+            data = b"".join(lines)
+            return data, line_offsets(data)
+        data = b"".join(lines)
+        offsets = line_offsets(data)
+        self.store_offsets(member.name, offsets)
+        return data, offsets
+
+    def read_lines(self, member_name: str, line_indices: Iterable[int],
+                   tar: Optional[tarfile.TarFile] = None) -> dict[int, bytes]:
+        """
+        read some lines of a member.
+        :param tar: opened tar file, otherwise it is opened for this call
+        :raises IndexError: if a line does not exist
+        """
+        if tar is None:
+            with tarfile.open(self.tar_file, 'r') as tar:
+                return self.read_lines(member_name, line_indices, tar)
+
+        member = self.tar_index.member(member_name)
+        offsets = self.get_offsets(member_name)
+        lines: dict[int, bytes] = {}
+        if offsets is None:
+            data, offsets = self._decompress_and_index(tar, member)
+            for line_idx in line_indices:
+                if not 0 <= line_idx < len(offsets) - 1:
+                    raise IndexError(f"line {line_idx} not in {member_name}")
+                lines[line_idx] = data[offsets[line_idx]:offsets[line_idx + 1]]
+            return lines
+
+        # seek forward through the decompressed stream and stop after the last line needed
+        with open_compressed(tar.extractfile(member.tarinfo()), member_name) as decompressed:
+            for line_idx in sorted(set(line_indices)):
+                if not 0 <= line_idx < len(offsets) - 1:
+                    raise IndexError(f"line {line_idx} not in {member_name}")
+                decompressed.seek(offsets[line_idx])
+                lines[line_idx] = decompressed.read(offsets[line_idx + 1] - offsets[line_idx])
+        return lines
+
+    def read_line(self, member_name: str, line_idx: int) -> bytes:
+        return self.read_lines(member_name, [line_idx])[line_idx]
+
+
+@lru_cache(maxsize=64)
+def load_line_index(tar_file: Path) -> LineIndex:
+    return LineIndex(tar_file)
+
+
+def build_line_index(tar_file: Path, skip_existing: bool = True):
+    """
+    store the line offsets of all members of a tar file
+    """
+    line_index = load_line_index(tar_file)
+    with tarfile.open(tar_file, 'r') as tar:
+        for member in tqdm(line_index.tar_index.members):
+            if skip_existing and line_index.get_offsets(member.name) is not None:
+                continue
+            line_index._decompress_and_index(tar, member)
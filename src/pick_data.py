@@ -7,12 +7,18 @@ import gzip
 import io
 import json
 import tarfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import TypeVar, Literal, cast
+from typing import TypeVar, Literal, cast, Iterable, Sequence, Union, Generator
 
 from sqlalchemy.orm import DeclarativeBase
 
-from src.consts import CONFIG
+from src.consts import CONFIG, locationindex_type
+from src.json_decoder import get_loads
+from src.line_index import load_line_index
+from src.tar_index import load_tar_index, read_member, TarMember
+from src.util import iter_compressed_lines
 
 # not sure if this is needed
 T = TypeVar('T', bound=DeclarativeBase)
@@ -21,10 +27,8 @@ ZipFormat = Literal["bz2", "gzip"]
 
 
 def extract_member_in_tar_file(tar_file: Path, member_name: str) -> bytes:
-    with tarfile.open(tar_file, 'r') as tar:
-        # relevant_members = [member for member in tar.getmembers() if
-        #                     (member.name.endswith('.json.bz2') or member.name.endswith('.json.gz'))]
-        return tar.extractfile(member_name).read()
+    # the tar index knows the offset of the member, no need to scan the tar file
+    return read_member(tar_file, load_tar_index(tar_file).member(member_name))
 
 
 def unpack(bytes_data: bytes, compression_type: ZipFormat, name: str):
@@ -48,6 +52,9 @@ def grab_post_from_location(location_index: tuple[str, str, str, int]) -> dict:
     if not tar_file_path.exists():
         raise FileNotFoundError(f"{tar_file_path} does not exist")
 
+    if CONFIG.USE_LINE_INDEX:
+        return get_loads()(load_line_index(tar_file_path).read_line(jsonl_file_name, jsonl_line))
+
     compressed_data: bytes = extract_member_in_tar_file(tar_file_path, jsonl_file_name)
     compression_type = Path(jsonl_file_name).suffix[1:]
     assert compression_type
@@ -78,6 +85,11 @@ def grab_posts_from_location(location_index: tuple[str, str, dict[str, list[int]
     data: list[dict] = []
 
     for jsonl_file_name, jsonl_lines in jsonl_file_names_and_lines.items():
+        if CONFIG.USE_LINE_INDEX:
+            loads = get_loads()
+            lines = load_line_index(tar_file_path).read_lines(jsonl_file_name, jsonl_lines)
+            data.extend(loads(lines[jsonl_idx]) for jsonl_idx in jsonl_lines)
+            continue
         compressed_data: bytes = extract_member_in_tar_file(tar_file_path, jsonl_file_name)
         compression_type = Path(jsonl_file_name).suffix[1:]
         assert compression_type
@@ -91,6 +103,105 @@ def grab_posts_from_location(location_index: tuple[str, str, dict[str, list[int]
     return data
 
 
+def _tar_file_path(dump_file_date_name: str, tar_file_date_name: str) -> Path:
+    p = CONFIG.STREAM_BASE_FOLDER / f"archiveteam-twitter-stream-{dump_file_date_name}"
+    if not p.exists():
+        raise FileNotFoundError(f"{p} does not exist")
+    tar_file_path = p / f"twitter-stream-{tar_file_date_name}.tar"
+    if not tar_file_path.exists():
+        raise FileNotFoundError(f"{tar_file_path} does not exist")
+    return tar_file_path
+
+
+def _read_member_lines(tar: tarfile.TarFile, member: TarMember, line_indices: list[int]) -> dict[int, bytes]:
+    """
+    decompress a member up to the last line needed
+    """
+    wanted = set(line_indices)
+    last_line = max(wanted)
+    lines: dict[int, bytes] = {}
+    for line_idx, line in enumerate(iter_compressed_lines(tar.extractfile(member.tarinfo()), member.name)):
+        if line_idx in wanted:
+            lines[line_idx] = line
+        if line_idx == last_line:
+            return lines
+    raise IndexError(f"line {last_line} not in {member.name}")
+
+
+def _grab_tar_file_posts(dump_file_date_name: str,
+                         tar_file_date_name: str,
+                         jsonl_file_names_and_lines: dict[str, list[int]]) -> dict[tuple[str, int], dict]:
+    """
+    read the requested lines of one tar file. The tar file is opened once and each member decompressed once.
+    :return: {(jsonl_file_name, jsonl_line): post}
+    """
+    tar_file_path = _tar_file_path(dump_file_date_name, tar_file_date_name)
+    loads = get_loads()
+    posts: dict[tuple[str, int], dict] = {}
+    with tarfile.open(tar_file_path, 'r') as tar:
+        # members in order of their position in the tar file
+        for jsonl_file_name in sorted(jsonl_file_names_and_lines):
+            jsonl_lines = jsonl_file_names_and_lines[jsonl_file_name]
+            if CONFIG.USE_LINE_INDEX:
+                lines = load_line_index(tar_file_path).read_lines(jsonl_file_name, jsonl_lines, tar)
+            else:
+                lines = _read_member_lines(tar, load_tar_index(tar_file_path).member(jsonl_file_name), jsonl_lines)
+            for jsonl_line, line in lines.items():
+                posts[(jsonl_file_name, jsonl_line)] = loads(line)
+    return posts
+
+
+def grab_posts(location_indices: Iterable[Sequence[Union[str, int]]],
+               workers: int = 1) -> Generator[dict, None, None]:
+    """
+    grab many posts by their location index (dump-folder, tar-file, tar-file-member, jsonl-line-index).
+    The requests are grouped by tar file and member, so each tar file is opened once and each member
+    decompressed once. The posts are yielded in the order of the location indices.
+    :param location_indices: e.g. of index entries (LocationMembers.location_index of DBPostIndexPost.location_key)
+    :param workers: number of processes, that read tar files in parallel
+    """
+    locations: list[locationindex_type] = [(str(dump), str(tar), str(member), int(line))
+                                           for dump, tar, member, line in location_indices]
+    # (dump, tar) -> member -> lines
+    groups: dict[tuple[str, str], dict[str, list[int]]] = {}
+    for dump, tar, member, line in locations:
+        groups.setdefault((dump, tar), {}).setdefault(member, []).append(line)
+
+    posts: dict[locationindex_type, dict] = {}
+    # locations can repeat. posts are dropped, after their last occurrence is yielded
+    remaining = Counter(locations)
+    next_idx = 0
+
+    def ready_posts() -> Generator[dict, None, None]:
+        # yield posts in the order of the locations, as far as they are available
+        nonlocal next_idx
+        while next_idx < len(locations) and locations[next_idx] in posts:
+            location = locations[next_idx]
+            remaining[location] -= 1
+            if remaining[location]:
+                yield posts[location]
+            else:
+                yield posts.pop(location)
+            next_idx += 1
+
+    def add_posts(dump_tar: tuple[str, str], tar_posts: dict[tuple[str, int], dict]):
+        for (member, line), post in tar_posts.items():
+            posts[(*dump_tar, member, line)] = post
+
+    sorted_groups = sorted(groups)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_grab_tar_file_posts, dump, tar, groups[(dump, tar)]): (dump, tar)
+                       for dump, tar in sorted_groups}
+            for future in as_completed(futures):
+                add_posts(futures[future], future.result())
+                yield from ready_posts()
+    else:
+        for dump, tar in sorted_groups:
+            add_posts((dump, tar), _grab_tar_file_posts(dump, tar, groups[(dump, tar)]))
+            yield from ready_posts()
+
+
 if __name__ == '__main__':
     # thats a test...
     data = grab_post_from_location(("2022-01", "20220101", "20220101/20220101000000.json.gz", 36))
@@ -0,0 +1,43 @@
+"""
+The few scalar fields of a batch of posts, that the filter and stats methods use, as plain lists.
+The fields are read from the posts once per batch (jsonl file) and shared by the methods,
+which then loop over the lists (there is no vectorized work).
+"""
+from dataclasses import dataclass
+from itertools import compress
+from typing import Optional
+
+from src.post_filter import is_original_tweet
+
+
+@dataclass
+class PostColumns:
+    lang: list[Optional[str]]
+    possibly_sensitive: list[bool]
+    has_location: list[bool]
+    is_original: list[bool]
+
+    @staticmethod
+    def from_posts(posts: list[dict]) -> "PostColumns":
+        columns = PostColumns([], [], [], [])
+        for post_data in posts:
+            get = post_data.get
+            columns.lang.append(get("lang"))
+            columns.possibly_sensitive.append(bool(get("possibly_sensitive", False)))
+            columns.has_location.append(get("geo") is not None or
+                                        get("coordinates") is not None or
+                                        get("place") is not None)
+            columns.is_original.append(is_original_tweet(post_data))
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.lang)
+
+    def compress(self, keep: list[bool]) -> "PostColumns":
+        """
+        the columns of the kept posts
+        """
+        return PostColumns(list(compress(self.lang, keep)),
+                           list(compress(self.possibly_sensitive, keep)),
+                           list(compress(self.has_location, keep)),
+                           list(compress(self.is_original, keep)))
@@ -1,7 +1,14 @@
-from typing import Optional
+import re
+from typing import Optional, Callable, Iterable
 
 from src.consts import CONFIG, logger
 
+# keys, that make a post not original (see is_original_tweet), with a value that is not null.
+# (a quote in a text is escaped, so these cannot match inside of strings)
+_NOT_ORIGINAL_RAW_PATTERN = re.compile(rb'"(?:in_reply_to_status_id|quoted_status_id)": ?\d'
+                                       rb'|"retweeted_status": ?\{'
+                                       rb'|"referenced_tweets": ?\[')
+
 
 def is_original_tweet(post_data: dict) -> bool:
     is_orig = (post_data.get("referenced_tweets") is None and
@@ -12,6 +19,28 @@ def is_original_tweet(post_data: dict) -> bool:
     return is_orig
 
 
+def raw_post_filter(languages: Iterable[str]) -> Callable[[bytes], bool]:
+    """
+    create a cheap check on a raw json line, if the post can be in one of the languages and be original.
+    It only rejects lines, that would be rejected after decoding:
+    - no "lang" key with one of the languages anywhere in the line
+    - a retweet, reply or quote marker (only for the flat format, not for the "data" wrapped format,
+    which can include other posts)
+    """
+    lang_markers = [marker.encode("utf-8")
+                    for lang in languages
+                    for marker in [f'"lang":"{lang}"', f'"lang": "{lang}"']]
+
+    def accepts(line: bytes) -> bool:
+        if not any(marker in line for marker in lang_markers):
+            return False
+        if line.startswith(b'{"data"'):
+            return True
+        return _NOT_ORIGINAL_RAW_PATTERN.search(line) is None
+
+    return accepts
+
+
 def check_contains_media(post: dict) -> Optional[bool]:
     for entities_dict_name in ["entities", "extended_entities"]:
         ent_dict = post.get(entities_dict_name, {})
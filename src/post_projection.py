@@ -0,0 +1,81 @@
+"""
+Projection of posts to a set of fields (dotted json paths), e.g. for slim repack files.
+A path selects the complete value at its end. Lists on the way are projected item by item:
+"entities.media.media_url_https" keeps only the urls of the media items.
+Paths that do not exist in a post are skipped.
+"""
+from typing import Any, Optional
+
+# the fields used by the methods, that run on the repack (post filter, stats, annotation, auto relevance)
+# and the post/annotation db helpers
+SLIM_FIELDS: list[str] = [
+    "id",
+    "id_str",
+    "created_at",
+    "timestamp_ms",
+    "lang",
+    "text",
+    "truncated",
+    "extended_tweet.full_text",
+    "possibly_sensitive",
+    "user.screen_name",
+    "geo",
+    "place",
+    "coordinates",
+    "in_reply_to_status_id",
+    "quoted_status_id",
+    "retweeted_status",
+    "referenced_tweets",
+    "entities.hashtags",
+    "entities.media.media_url_https",
+    "extended_entities.media.media_url_https",
+]
+
+FIELD_PRESETS: dict[str, list[str]] = {
+    "slim": SLIM_FIELDS
+}
+
+# key -> sub tree; None: keep the complete value
+FieldTree = dict[str, Optional["FieldTree"]]
+
+
+def field_tree(fields: list[str]) -> FieldTree:
+    tree: FieldTree = {}
+    for field in fields:
+        node = tree
+        keys = field.split(".")
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                # a shorter path keeps the complete value already
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+    return tree
+
+
+def project(data: Any, tree: FieldTree) -> Any:
+    if isinstance(data, list):
+        return [project(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    projected = {}
+    for key, sub_tree in tree.items():
+        if key in data:
+            projected[key] = data[key] if sub_tree is None else project(data[key], sub_tree)
+    return projected
+
+
+class PostProjection:
+    """
+    projects posts to the given fields or preset (see FIELD_PRESETS)
+    """
+
+    def __init__(self, fields: list[str] | str):
+        if isinstance(fields, str):
+            fields = FIELD_PRESETS[fields]
+        self.fields = fields
+        self.tree = field_tree(fields)
+
+    def __call__(self, post_data: dict) -> dict:
+        return project(post_data, self.tree)
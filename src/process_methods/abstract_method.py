@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Any, Type, Union
+from itertools import compress
+from typing import Optional, Any, Type, Union, Callable
 
 from pydantic import BaseModel
 
 from src.consts import locationindex_type, DATA_SOURCE_DUMP, DATA_SOURCE_REPACK, CONFIG
 from src.models import IterationSettings, ProcessCancel, MethodDefinition
+from src.post_columns import PostColumns
 from src.status import MonthDatasetStatus, MainStatus
 
 
@@ -26,10 +28,87 @@ class IterationMethod(ABC):
             return self.current_result
         return None
 
+    def supports_batch(self) -> bool:
+        """
+        methods that implement _process_batch
+        """
+        return type(self)._process_batch is not IterationMethod._process_batch
+
+    def process_batch(self, posts: list[dict],
+                      location_indices: list[locationindex_type],
+                      columns: PostColumns) -> list[bool]:
+        """
+        process a batch of posts (e.g. a whole jsonl file), with the columns of their scalar fields.
+        returns for each post, if it is kept (not canceled) for the following methods.
+        methods, which do not implement _process_batch, process the posts one by one
+        """
+        return self._process_batch(posts, location_indices, columns)
+
+    def _process_batch(self, posts: list[dict],
+                       location_indices: list[locationindex_type],
+                       columns: PostColumns) -> list[bool]:
+        return [self.process_data(post_data, location_index) is None
+                for post_data, location_index in zip(posts, location_indices)]
+
     @staticmethod
     def compatible_with_data_sources() -> list[str]:
         return [DATA_SOURCE_DUMP, DATA_SOURCE_REPACK]
 
+    def raw_line_filter(self) -> Optional[Callable[[bytes], bool]]:
+        """
+        optional check on the raw (not decoded) json line. lines, for which it returns False are not decoded.
+        It is only used for the first method, and it must not reject lines that _process_data would accept
+        """
+        return None
+
+    @staticmethod
+    def parallel_safe() -> bool:
+        """
+        methods that can run in separate worker processes (one instance per tar file)
+        and combine their results with `merge`
+        """
+        return False
+
+    def skip_tar_file(self, tar_file_date_name: str) -> bool:
+        """
+        checked in the main process before tar files are handed to workers
+        """
+        return False
+
+    def init_worker(self, part_key: str) -> None:
+        """
+        called on the instance in a worker process, before processing.
+        part_key is unique for the part (e.g. the tar file date)
+        """
+        pass
+
+    def partial_result(self) -> Any:
+        """
+        called on the instance in a worker process, after processing.
+        the result must be picklable and is passed to `merge` in the main process
+        """
+        return None
+
+    def merge(self, partial: Any) -> None:
+        """
+        called on the main process instance with the partial results of the workers,
+        in the order of the parts (tar files)
+        """
+        pass
+
+    def checkpoint_state(self) -> Any:
+        """
+        picklable snapshot of the state, stored after each tar file (see src/checkpoint.py).
+        None for methods without state (or with their state on disk)
+        """
+        return None
+
+    def restore_checkpoint(self, state: Any) -> None:
+        """
+        restore the state of `checkpoint_state` when a run is resumed
+        """
+        pass
+
     @staticmethod
     @abstractmethod
     def name() -> str:
@@ -66,3 +145,38 @@ def create_methods(settings: IterationSettings, methods: list[MethodDefinition])
     for method in _methods:
         method.set_methods(_method_dict)
     return _methods
+
+
+def process_batch_with_methods(methods: list[IterationMethod],
+                               posts: list[dict],
+                               location_indices: list[locationindex_type]) -> None:
+    """
+    pass the batch through all methods. posts that a method cancels, are removed for the following methods
+    """
+    columns = PostColumns.from_posts(posts)
+    for method in methods:
+        if not posts:
+            return
+        keep = method.process_batch(posts, location_indices, columns)
+        if not all(keep):
+            posts = list(compress(posts, keep))
+            location_indices = list(compress(location_indices, keep))
+            columns = columns.compress(keep)
+
+
+def method_definitions(methods: list[IterationMethod]) -> list[tuple[Type[IterationMethod], Any]]:
+    """
+    picklable (type, config) pairs, to recreate the methods in worker processes
+    """
+    return [(type(method), method.config) for method in methods]
+
+
+def create_worker_methods(settings: IterationSettings,
+                          definitions: list[tuple[Type[IterationMethod], Any]],
+                          part_key: str) -> list[IterationMethod]:
+    _methods = [method_type(settings, config) for method_type, config in definitions]
+    _method_dict = {method.name(): method for method in _methods}
+    for method in _methods:
+        method.set_methods(_method_dict)
+        method.init_worker(part_key)
+    return _methods
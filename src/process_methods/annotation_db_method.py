@@ -96,6 +96,20 @@ class AnnotPostCollection:
                 return ace
         return None
 
+    def merge(self, collection: dict[str, dict[int, dict[int, Optional[AnnotCollectionEntry]]]]):
+        """
+        merge the collection of another (worker) instance. keeps the earlier post for each hour slot.
+        on equal times, the already existing entry is kept
+        """
+        for lang, days in collection.items():
+            for day, hours in days.items():
+                for hour, col_entry in hours.items():
+                    if not col_entry:
+                        continue
+                    current = self._col[lang][day][hour]
+                    if not current or col_entry.dt < current.dt:
+                        self._col[lang][day][hour] = col_entry
+
     def validate(self):
         for lang, days in self._col.items():
             for day, hours in days.items():
@@ -103,7 +117,8 @@ class AnnotPostCollection:
                     if not col_entry:
                         print(f"Missing post for: {lang}-day:{day}-hour:{hour}")
 
-    def create_annot1(self, post_data: dict,
+    @staticmethod
+    def create_annot1(post_data: dict,
                       location_index: Optional[tuple[str, str, str, int]] = None) -> DBAnnot1Post:
         db_post = DBAnnot1Post(
             post_url=post_url(post_data),
@@ -157,6 +172,23 @@ class AnnotationDBMethod(IterationMethod):
     def name() -> str:
         return METHOD_ANNOTATION_DB
 
+    @staticmethod
+    def parallel_safe() -> bool:
+        return True
+
+    def partial_result(self) -> dict[str, dict[int, dict[int, Optional[AnnotCollectionEntry]]]]:
+        return self.post_collection._col
+
+    def checkpoint_state(self) -> dict[str, dict[int, dict[int, Optional[AnnotCollectionEntry]]]]:
+        return self.post_collection._col
+
+    def restore_checkpoint(self, state: Optional[dict[str, dict[int, dict[int, Optional[AnnotCollectionEntry]]]]]) -> None:
+        if state is not None:
+            self.post_collection._col = state
+
+    def merge(self, partial: dict[str, dict[int, dict[int, Optional[AnnotCollectionEntry]]]]) -> None:
+        self.post_collection.merge(partial)
+
     def _process_data(self, post_data: dict, location_index: locationindex_type) -> Any:
         self.post_collection.add_post(post_data, location_index)
 
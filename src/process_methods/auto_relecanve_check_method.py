@@ -1,4 +1,6 @@
+import shutil
 from multiprocessing.process import current_process
+from pathlib import Path
 from typing import Optional, Union, Any
 
 import jsonlines
@@ -42,11 +44,32 @@ class AutoRelevanceMethod(IterationMethod):
             locationindex_type, dict, list[str]
         ]] = []
         self.current_lang: Optional[str] = None
+        # set in worker processes. entries are dumped into part files, which are merged in the main process
+        self.part_key: Optional[str] = None
+        # (part file, destination file)
+        self.part_files: list[tuple[Path, Path]] = []
 
     @staticmethod
     def name() -> str:
         return METHOD_AUTO_RELEVANCE
 
+    @staticmethod
+    def parallel_safe() -> bool:
+        return True
+
+    def init_worker(self, part_key: str) -> None:
+        self.part_key = part_key
+
+    def partial_result(self) -> list[tuple[Path, Path]]:
+        self.dump()
+        return self.part_files
+
+    def merge(self, partial: list[tuple[Path, Path]]) -> None:
+        for part_file, dest_file in partial:
+            with part_file.open("rb") as f_in, dest_file.open("ab") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            part_file.unlink()
+
     def _process_data(self, post_data: dict, location_index: locationindex_type) -> Any:
         relevant_words = self.relevance_checker.exact_search(get_post_text(post_data))
         if relevant_words and len(relevant_words) >= self.config.min_relevant_words:
@@ -59,10 +82,17 @@ class AutoRelevanceMethod(IterationMethod):
                 self.dump()
 
     def dump(self):
+        if not self.relevant_sentences:
+            return
         # first self.relevant_sentences, location_index [2] is language
         logger.info("dumping entries")
         settings = SingleLanguageSettings.from_iter_settings(self.settings, self.relevant_sentences[0][0][2])
         dest = AUTO_RELEVANT_COLLECTION / f"{year_month_lang_str(settings)}.jsonl"
+        if self.part_key:
+            part_file = AUTO_RELEVANT_COLLECTION / f"{year_month_lang_str(settings)}.{self.part_key}.jsonl"
+            if (part_file, dest) not in self.part_files:
+                self.part_files.append((part_file, dest))
+            dest = part_file
         with dest.open("a", encoding="utf-8") as fout:
             jsonlines.Writer(fout).write_all(self.relevant_sentences)
         self.relevant_sentences.clear()
@@ -1,30 +1,196 @@
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, Optional, Union
 
-from src.consts import locationindex_type
-from src.db.models import DBPost
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import Connection, insert, select, func, delete
+
+from src.consts import locationindex_type, logger, METHOD_FULL_POSTS
+from src.db.db import init_db_engine, main_db_path, set_bulk_load_pragmas, end_bulk_load
+from src.db.location_index import LocationMembers
+from src.db.models import DBPost, DBFullPost, DBCompressionDictionary
+from src.db.post_compression import PostCompression, PostCompressor, available_compression, train_dictionary, \
+    store_dictionary, load_dictionary
 from src.models import IterationSettings
 from src.process_methods.abstract_method import IterationMethod
+from src.repack_format import dumps_post
 from src.status import MonthDatasetStatus
 from src.util import post_date, post_url, get_post_text
 
 
+class FullPostDBConfig(BaseModel):
+    # falls back to zlib, if zstandard is not installed
+    compression: PostCompression = "zstd"
+    compression_level: Optional[int] = None
+    # the first posts of each language are used for training the dictionary
+    dictionary_samples: int = Field(5000, ge=0)
+    dictionary_size: int = Field(112 * 1024, ge=1024)
+    # rows per executemany/commit
+    batch_size: int = Field(5000, ge=1)
+
+    model_config = ConfigDict(extra='ignore')
+
+
+class LanguageStore:
+    """
+    the connection, dictionary and pending rows of the db of one language
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.members = LocationMembers(connection)
+        self.compressor: Optional[PostCompressor] = None
+        self.dictionary_id: Optional[int] = None
+        # (row without content, post json) until the dictionary is trained
+        self.samples: list[tuple[dict, bytes]] = []
+        self.rows: list[dict] = []
+        self.raw_size = 0
+        self.compressed_size = 0
+
+
+@dataclass
+class LanguageCheckpoint:
+    # the last ids in the db at the checkpoint
+    last_post_id: int
+    last_dictionary_id: int
+    dictionary_id: Optional[int]
+    # not compressed yet, when the dictionary is not trained
+    samples: list[tuple[dict, bytes]]
+    raw_size: int
+    compressed_size: int
+
+
 class FullPostDBMethod(IterationMethod):
     """
-    TODO implement
+    Stores the complete posts with their content compressed (see src/db/post_compression.py)
     """
 
-    def __init__(self, settings: IterationSettings, config: dict):
+    def __init__(self, settings: IterationSettings, config: Optional[Union[FullPostDBConfig, dict]] = None):
         super().__init__(settings, config)
+        if isinstance(config, FullPostDBConfig):
+            self.config = config
+        else:
+            self.config = FullPostDBConfig.model_validate(config or {})
+        self.compression = available_compression(self.config.compression)
+
+        self._stores: dict[str, LanguageStore] = {}
+        for lang in settings.languages:
+            connection = init_db_engine(main_db_path(settings.year,
+                                                     settings.month,
+                                                     lang,
+                                                     settings.annotation_extra)).connect()
+            set_bulk_load_pragmas(connection)
+            self._stores[lang] = LanguageStore(connection)
 
     @staticmethod
     def name() -> str:
-        return "full-posts"
+        return METHOD_FULL_POSTS
+
+    @staticmethod
+    def _create_row(post_data: dict, location_key: int) -> dict:
+        post_dt = post_date(post_data['timestamp_ms'])
+        return {
+            "platform_id": post_data["id_str"],
+            "post_url_computed": post_url(post_data),
+            "date_created": post_dt,
+            "language": post_data["lang"],
+            "location_key": location_key,
+            "text": get_post_text(post_data),
+            "year_created": post_dt.year,
+            "month_created": post_dt.month,
+            "day_created": post_dt.day,
+            "hour_created": post_dt.hour,
+        }
+
+    def _init_dictionary(self, store: LanguageStore):
+        """
+        train and store the dictionary on the sample posts and compress them
+        """
+        dictionary = train_dictionary(self.compression,
+                                      [content for _, content in store.samples],
+                                      self.config.dictionary_size)
+        store.dictionary_id = store_dictionary(store.connection, self.compression, dictionary)
+        store.connection.commit()
+        store.compressor = PostCompressor(self.compression, dictionary, self.config.compression_level)
+        for row, content in store.samples:
+            self._add_row(store, row, content)
+        store.samples.clear()
+
+    def _add_row(self, store: LanguageStore, row: dict, content: bytes):
+        row["content"] = store.compressor.compress(content)
+        row["dictionary_id"] = store.dictionary_id
+        store.raw_size += len(content)
+        store.compressed_size += len(row["content"])
+        store.rows.append(row)
+        if len(store.rows) >= self.config.batch_size:
+            self._insert_rows(store)
+
+    def _insert_rows(self, store: LanguageStore):
+        if not store.rows:
+            return
+        store.connection.execute(insert(DBFullPost), store.rows)
+        store.connection.commit()
+        store.rows.clear()
 
     def _process_data(self, post_data: dict, location_index: locationindex_type) -> Any:
-        pass
+        store = self._stores[post_data["lang"]]
+        row = self._create_row(post_data, store.members.location_key(location_index))
+        content = dumps_post(post_data)
+        if store.compressor is None:
+            store.samples.append((row, content))
+            if len(store.samples) >= self.config.dictionary_samples:
+                self._init_dictionary(store)
+        else:
+            self._add_row(store, row, content)
+
+    def checkpoint_state(self) -> dict[str, LanguageCheckpoint]:
+        """
+        insert the pending rows. The samples are kept until the dictionary is trained
+        """
+        state = {}
+        for lang, store in self._stores.items():
+            self._insert_rows(store)
+            state[lang] = LanguageCheckpoint(
+                store.connection.execute(select(func.max(DBFullPost.id))).scalar() or 0,
+                store.connection.execute(select(func.max(DBCompressionDictionary.id))).scalar() or 0,
+                store.dictionary_id,
+                list(store.samples),
+                store.raw_size,
+                store.compressed_size)
+        return state
+
+    def restore_checkpoint(self, state: Optional[dict[str, LanguageCheckpoint]]) -> None:
+        """
+        delete the posts and dictionaries, that were inserted after the checkpoint and restore the samples
+        or the dictionary
+        """
+        if state is None:
+            return
+        for lang, store in self._stores.items():
+            lang_state = state.get(lang)
+            if lang_state is None:
+                continue
+            store.connection.execute(delete(DBFullPost).where(DBFullPost.id > lang_state.last_post_id))
+            store.connection.execute(
+                delete(DBCompressionDictionary).where(DBCompressionDictionary.id > lang_state.last_dictionary_id))
+            store.connection.commit()
+            store.samples = list(lang_state.samples)
+            store.raw_size, store.compressed_size = lang_state.raw_size, lang_state.compressed_size
+            store.dictionary_id = lang_state.dictionary_id
+            if store.dictionary_id is not None:
+                compression, dictionary = load_dictionary(store.connection, store.dictionary_id)
+                store.compressor = PostCompressor(compression, dictionary, self.config.compression_level)
 
     def finalize(self):
-        pass
+        for lang, store in self._stores.items():
+            if store.compressor is None:
+                self._init_dictionary(store)
+            self._insert_rows(store)
+            end_bulk_load(store.connection)
+            store.connection.close()
+            if store.raw_size:
+                logger.info(f"full posts {lang}: {store.raw_size / 1024 / 1024:.1f}MB json, "
+                            f"{store.compressed_size / 1024 / 1024:.1f}MB compressed "
+                            f"({store.compressed_size / store.raw_size:.1%})")
 
     def set_ds_status_field(self, status: MonthDatasetStatus) -> None:
         pass
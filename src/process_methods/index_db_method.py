@@ -1,14 +1,30 @@
-from sqlalchemy.orm import sessionmaker
+from typing import Union, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import Connection, insert, select, func, delete
 
 from src.consts import METHOD_INDEX_DB, locationindex_type
-from src.db.db import init_db, main_db_path
+from src.db.db import init_db_engine, main_db_path, set_bulk_load_pragmas, end_bulk_load
+from src.db.location_index import LocationMembers
 from src.db.models import DBPostIndexPost
+from src.db.post_index_query import create_post_index_indexes
 from src.models import IterationSettings
 from src.process_methods.abstract_method import IterationMethod
 from src.status import MonthDatasetStatus
 from src.util import post_date, post_url
 
 
+class IndexEntriesDBConfig(BaseModel):
+    # rows per executemany/commit
+    batch_size: int = Field(10000, ge=1)
+    # sqlite page cache of each connection
+    cache_size_mb: int = Field(256, ge=1)
+    # create the indexes of the table after loading (see src/db/post_index_query.py)
+    create_indexes: bool = True
+
+    model_config = ConfigDict(extra='ignore')
+
+
 class IndexEntriesDB(IterationMethod):
     """
     Create an index db entry, that allows to look up
@@ -18,50 +34,101 @@ class IndexEntriesDB(IterationMethod):
     def name() -> str:
         return METHOD_INDEX_DB
 
-    def __init__(self, settings: IterationSettings):
-        super().__init__(settings)
+    def __init__(self, settings: IterationSettings, config: Optional[Union[IndexEntriesDBConfig, dict]] = None):
+        super().__init__(settings, config)
+        if isinstance(config, IndexEntriesDBConfig):
+            self.config = config
+        else:
+            self.config = IndexEntriesDBConfig.model_validate(config or {})
 
-        self.index_entries: dict[str, list[DBPostIndexPost]] = {}
-        self.DUMP_THRESH = 500
-        self._language_sessionmakers: dict[str, sessionmaker] = {}
+        self.index_rows: dict[str, list[dict]] = {}
+        # one connection for each language, for the whole load (core inserts, no orm objects)
+        self._language_connections: dict[str, Connection] = {}
+        self._language_members: dict[str, LocationMembers] = {}
         for lang in settings.languages:
-            self.index_entries[lang] = []
-            self._language_sessionmakers[lang] = init_db(
-                main_db_path(settings.year,
-                             settings.month,
-                             lang,
-                             settings.annotation_extra))
+            self.index_rows[lang] = []
+            engine = init_db_engine(main_db_path(settings.year,
+                                                 settings.month,
+                                                 lang,
+                                                 settings.annotation_extra))
+            connection = engine.connect()
+            set_bulk_load_pragmas(connection, self.config.cache_size_mb)
+            self._language_connections[lang] = connection
+            self._language_members[lang] = LocationMembers(connection)
 
     @staticmethod
-    def _create_index_entry(post_data: dict, location_index: locationindex_type) -> DBPostIndexPost:
+    def _create_index_entry(post_data: dict, location_key: int) -> DBPostIndexPost:
         post_dt = post_date(post_data['timestamp_ms'])
         post = DBPostIndexPost(
             platform="twitter",
             post_url_computed=post_url(post_data),
             date_created=post_dt,
             language=post_data["lang"],
-            location_index=list(location_index),
+            location_key=location_key,
         )
         post.set_date_columns()
         return post
 
+    @staticmethod
+    def _create_index_row(post_data: dict, location_key: int) -> dict:
+        post_dt = post_date(post_data['timestamp_ms'])
+        return {
+            "platform": "twitter",
+            "post_url_computed": post_url(post_data),
+            "date_created": post_dt,
+            "language": post_data["lang"],
+            "location_key": location_key,
+            "year_created": post_dt.year,
+            "month_created": post_dt.month,
+            "day_created": post_dt.day,
+            "hour_created": post_dt.hour,
+        }
+
+    def _insert_rows(self, lang: str):
+        rows = self.index_rows[lang]
+        if not rows:
+            return
+        connection = self._language_connections[lang]
+        connection.execute(insert(DBPostIndexPost), rows)
+        connection.commit()
+        rows.clear()
+
     def _process_data(self, post_data: dict, location_index: locationindex_type):
-        entry = self._create_index_entry(post_data, location_index)
-        lang = entry.language
-        self.index_entries[lang].append(entry)
+        lang = post_data["lang"]
+        location_key = self._language_members[lang].location_key(location_index)
+        self.index_rows[lang].append(self._create_index_row(post_data, location_key))
+
+        if len(self.index_rows[lang]) >= self.config.batch_size:
+            self._insert_rows(lang)
+
+    def checkpoint_state(self) -> dict[str, int]:
+        """
+        insert the pending rows.
+        :return: the last row id of each language
+        """
+        last_ids = {}
+        for lang, connection in self._language_connections.items():
+            self._insert_rows(lang)
+            last_ids[lang] = connection.execute(select(func.max(DBPostIndexPost.id))).scalar() or 0
+        return last_ids
 
-        if len(self.index_entries[lang]) > self.DUMP_THRESH:
-            with self._language_sessionmakers[lang]() as session:
-                session.add_all(self.index_entries[lang])
-                session.commit()
-                self.index_entries[lang].clear()
+    def restore_checkpoint(self, state: Optional[dict[str, int]]) -> None:
+        """
+        delete the rows, that were inserted after the checkpoint (of the unfinished tar file)
+        """
+        if state is None:
+            return
+        for lang, connection in self._language_connections.items():
+            connection.execute(delete(DBPostIndexPost).where(DBPostIndexPost.id > state.get(lang, 0)))
+            connection.commit()
 
     def finalize(self):
-        for lang in self._language_sessionmakers:
-            with self._language_sessionmakers[lang]() as session:
-                session.add_all(self.index_entries[lang])
-                session.commit()
-                self.index_entries[lang].clear()
+        for lang, connection in self._language_connections.items():
+            self._insert_rows(lang)
+            if self.config.create_indexes:
+                create_post_index_indexes(connection)
+            end_bulk_load(connection)
+            connection.close()
 
     def set_ds_status_field(self, status: MonthDatasetStatus) -> None:
         status.index_db_available = True
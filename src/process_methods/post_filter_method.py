@@ -1,10 +1,11 @@
-from typing import Any, Union
+from typing import Any, Union, Optional, Callable
 
 from pydantic import BaseModel
 
 from src.consts import METHOD_FILTER, locationindex_type, CONFIG
 from src.models import ProcessCancel, IterationSettings
-from src.post_filter import is_original_tweet, check_contains_media
+from src.post_columns import PostColumns
+from src.post_filter import is_original_tweet, check_contains_media, raw_post_filter
 from src.process_methods.abstract_method import IterationMethod
 from src.status import MonthDatasetStatus
 
@@ -12,6 +13,8 @@ from src.status import MonthDatasetStatus
 class PostFilterConfig(BaseModel):
     filter_sensitive: bool = False
     filter_no_location: bool = False
+    # skip posts by checking the raw json line, before decoding it
+    raw_prefilter: bool = True
 
 
 class PostFilterMethod(IterationMethod):
@@ -22,11 +25,19 @@ class PostFilterMethod(IterationMethod):
     def __init__(self, settings: IterationSettings, config: Union[dict, BaseModel]) -> None:
         super().__init__(settings, config)
         self.config = PostFilterConfig.model_validate(config)
+        self._raw_filter = raw_post_filter(CONFIG.LANGUAGES) if self.config.raw_prefilter else None
 
     @staticmethod
     def name() -> str:
         return METHOD_FILTER
 
+    @staticmethod
+    def parallel_safe() -> bool:
+        return True
+
+    def raw_line_filter(self) -> Optional[Callable[[bytes], bool]]:
+        return self._raw_filter
+
     def has_media_filter(self, post_data: dict) -> bool:
         return check_contains_media(post_data)
 
@@ -52,6 +63,18 @@ class PostFilterMethod(IterationMethod):
             return post_data.get("lang")
         return ProcessCancel("filtered out")
 
+    def _process_batch(self, posts: list[dict],
+                       location_indices: list[locationindex_type],
+                       columns: PostColumns) -> list[bool]:
+        languages = set(CONFIG.LANGUAGES)
+        keep = [lang in languages and is_original
+                for lang, is_original in zip(columns.lang, columns.is_original)]
+        if self.config.filter_sensitive:
+            keep = [k and not sensitive for k, sensitive in zip(keep, columns.possibly_sensitive)]
+        if self.config.filter_no_location:
+            keep = [k and has_location for k, has_location in zip(keep, columns.has_location)]
+        return keep
+
     def finalize(self):
         pass
 
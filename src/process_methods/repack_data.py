@@ -1,15 +1,21 @@
 import gzip
-from dataclasses import dataclass
+import os
+import shutil
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, Union, Optional, TextIO, Literal, BinaryIO
 
 from jsonlines import jsonlines
 from pydantic import BaseModel, ConfigDict
 
 from src.consts import locationindex_type, BASE_REPACK_PATH, get_logger, DATA_SOURCE_DUMP, METHOD_REPACK
+from src.helper.repack_stats import RepackFileCount, store_repack_file_counts
 from src.models import IterationSettings, ProcessSkipType
+from src.post_projection import PostProjection
 from src.process_methods.abstract_method import IterationMethod
+from src.repack_format import PackCompression, PackWriter, available_compression, pack_file_suffix, \
+    CompressedRecordWriter, JsonlGzipWriter, PACK_SUFFIX
 from src.status import MonthDatasetStatus
 from src.util import year_month_str, post_date2
 
@@ -21,6 +27,14 @@ class PackEntriesConfig(BaseModel):
     delete_jsonl_files: bool = True
     gzip_files: bool = True
     skip_existing_days: bool = True
+    # jsonl: <bucket>.jsonl(.gz), pack: length prefixed records, compressed (see src/repack_format.py)
+    file_format: Literal["jsonl", "pack"] = "jsonl"
+    # used for file_format: pack. gzip, if zstandard is not installed
+    pack_compression: PackCompression = "zstd"
+    # level of the gzip/zstd compressor. default: gzip 9, zstd 3
+    compression_level: Optional[int] = None
+    # only keep these fields (dotted json paths) of the posts or a preset (e.g. "slim", see src/post_projection.py)
+    fields: Optional[Union[list[str], Literal["slim"]]] = None
 
     model_config = ConfigDict(extra='ignore')
 
@@ -29,7 +43,19 @@ class PackEntriesConfig(BaseModel):
 class WriteInfo:
     bucket_dt: datetime
     file_path: Path
-    writer: jsonlines.Writer
+    writer: Union[jsonlines.Writer, CompressedRecordWriter]
+    fp: Union[TextIO, BinaryIO]
+    # written posts
+    count: int = 0
+
+
+@dataclass
+class RepackCheckpoint:
+    # lang -> (bucket, file path, written bytes, written posts) of the open files
+    open_files: dict[str, tuple[datetime, Path, int, int]]
+    file_counts: dict[str, RepackFileCount]
+    # size of the destination files, that part files were merged into
+    merged_sizes: dict[Path, int] = field(default_factory=dict)
 
 
 class RepackEntriesMethod(IterationMethod):
@@ -43,11 +69,23 @@ class RepackEntriesMethod(IterationMethod):
             self.config = PackEntriesConfig.model_validate(config or {})
         else:
             self.config = config
+        if self.config.file_format == "pack":
+            self.pack_compression = available_compression(self.config.pack_compression)
+
+        self.projection: Optional[PostProjection] = PostProjection(self.config.fields) if self.config.fields else None
 
         self.base_path = BASE_REPACK_PATH / year_month_str(settings.year, settings.month)
         self.base_path.mkdir(exist_ok=True)
         self.fouts: dict[str, WriteInfo] = {}
         self.skip_day: bool = self.config.skip_existing_days
+        # set in worker processes. files are written as parts and merged in the main process
+        self.part_key: Optional[str] = None
+        # (part file, destination file)
+        self.part_files: list[tuple[Path, Path]] = []
+        # number of posts of the finished files (destination file path relative to BASE_REPACK_PATH)
+        self.file_counts: dict[str, RepackFileCount] = {}
+        # destination files, that part files were merged into in this run (with their size)
+        self.merged_sizes: dict[Path, int] = {}
 
     @staticmethod
     def compatible_with_data_sources() -> list[str]:
@@ -57,11 +95,90 @@ class RepackEntriesMethod(IterationMethod):
     def name() -> str:
         return METHOD_REPACK
 
-    def zip_file(self, fp: Path):
+    @staticmethod
+    def parallel_safe() -> bool:
+        return True
+
+    def skip_tar_file(self, tar_file_date_name: str) -> bool:
+        # not after restoring a checkpoint: the days of the unfinished tar files might exist already
+        return self.skip_day and self._check_day_exists(tar_file_date_name)
+
+    def init_worker(self, part_key: str) -> None:
+        # existing days are checked in the main process (skip_tar_file), before the workers create day folders
+        self.skip_day = False
+        self.part_key = part_key
+
+    def partial_result(self) -> tuple[list[tuple[Path, Path]], dict[str, RepackFileCount]]:
+        self.finalize_files()
+        return self.part_files, self.file_counts
+
+    def merge(self, partial: tuple[list[tuple[Path, Path]], dict[str, RepackFileCount]]) -> None:
+        """
+        append the part files to their destination files and add up their counts.
+        gzip files can be concatenated (multiple members).
+        Destination files of an earlier run are replaced by the first part file, like in a single process
+        """
+        part_files, file_counts = partial
+        for part_file, dest_file in part_files:
+            mode = "ab" if dest_file in self.merged_sizes else "wb"
+            with part_file.open("rb") as f_in, dest_file.open(mode) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            self.merged_sizes[dest_file] = os.path.getsize(dest_file)
+            part_file.unlink()
+        for path, file_count in file_counts.items():
+            if path in self.file_counts:
+                self.file_counts[path].count += file_count.count
+            else:
+                self.file_counts[path] = file_count
+
+    def _compression_level(self) -> int:
+        return 9 if self.config.compression_level is None else self.config.compression_level
+
+    def zip_file(self, fp: Path) -> Path:
         dest_fp = fp.parent / f"{fp.name}.gz"
-        with open(fp, 'rt', encoding='utf-8') as f_in:
-            with gzip.open(dest_fp, 'wb') as f_out:
-                f_out.write(f_in.read().encode('utf-8'))
+        with open(fp, 'rb') as f_in:
+            with gzip.open(dest_fp, 'wb', compresslevel=self._compression_level()) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        return dest_fp
+
+    def _writes_compressed(self) -> bool:
+        """
+        the file is written through a compressor. Otherwise, a jsonl file is written (and zipped when it is finished)
+        """
+        return self.config.file_format == "pack" or (self.config.gzip_files and self.config.delete_jsonl_files)
+
+    def _open_writer(self, bucket_dt: datetime, file_path: Path, append: bool = False) -> WriteInfo:
+        if self.config.file_format == "pack":
+            fp = file_path.open("ab" if append else "wb")
+            writer = PackWriter(fp, self.pack_compression, self.config.compression_level)
+        elif self._writes_compressed():
+            fp = file_path.open("ab" if append else "wb")
+            writer = JsonlGzipWriter(fp, self._compression_level())
+        else:
+            fp = file_path.open("a" if append else "w", encoding="utf-8")
+            writer = jsonlines.Writer(fp)
+        return WriteInfo(bucket_dt, file_path, writer, fp)
+
+    def _dest_file(self, fp: Path) -> Path:
+        if self.part_key:
+            return fp.parent / fp.name.replace(f".{self.part_key}", "", 1)
+        return fp
+
+    def _remove_part_files(self):
+        """
+        remove the part files of workers of an interrupted run
+        """
+        for fp in self.base_path.glob("*/*/*.*.*"):
+            # <bucket>.<part_key>.jsonl(.gz) / <bucket>.<part_key>.pack.<compression>
+            if fp.name.split(".")[1] not in ("jsonl", PACK_SUFFIX.lstrip(".")):
+                fp.unlink()
+
+    def _add_part_file(self, fp: Path):
+        self.part_files.append((fp, self._dest_file(fp)))
+
+    def _add_file_count(self, info: WriteInfo, fp: Path):
+        path = self._dest_file(fp).relative_to(BASE_REPACK_PATH).as_posix()
+        self.file_counts[path] = RepackFileCount(path, info.file_path.parent.name, info.bucket_dt, info.count)
 
     def _finalize_file(self, info: WriteInfo):
         """
@@ -70,11 +187,25 @@ class RepackEntriesMethod(IterationMethod):
         Check config options, for deletion and zipping
         """
         info.writer.close()
+        info.fp.close()
+        if self._writes_compressed():
+            # written compressed already
+            if self.part_key:
+                self._add_part_file(info.file_path)
+            self._add_file_count(info, info.file_path)
+            return
         # check if we can just delete the file
         if self.config.gzip_files:
-            self.zip_file(info.file_path)
+            gz_file_path = self.zip_file(info.file_path)
+            if self.part_key:
+                self._add_part_file(gz_file_path)
+            self._add_file_count(info, gz_file_path)
+        else:
+            self._add_file_count(info, info.file_path)
         if self.config.delete_jsonl_files:
             info.file_path.unlink()
+        elif self.part_key:
+            self._add_part_file(info.file_path)
 
     def finalize_files(self):
         """
@@ -100,10 +231,49 @@ class RepackEntriesMethod(IterationMethod):
         bucket_dt = datetime(post_date_.year, post_date_.month, post_date_.day, group_hour, group_minute)
 
         time_str = f"{y_m_d_str}{group_hour_str}{group_minute_str}"
-        jsonl_file = day_lang_folder / f"{time_str}.jsonl"
-        writer = jsonlines.open(jsonl_file, mode='w')
+        file_name = f"{time_str}.{self.part_key}" if self.part_key else time_str
+        if self.config.file_format == "pack":
+            file_path = day_lang_folder / f"{file_name}{pack_file_suffix(self.pack_compression)}"
+        elif self._writes_compressed():
+            file_path = day_lang_folder / f"{file_name}.jsonl.gz"
+        else:
+            file_path = day_lang_folder / f"{file_name}.jsonl"
+        self.fouts[post_data["lang"]] = self._open_writer(bucket_dt, file_path)
+
+    def checkpoint_state(self) -> RepackCheckpoint:
+        """
+        the open files, how much is written to them, the counts of the finished files and sizes of the merged files
+        """
+        open_files = {}
+        for lang, info in self.fouts.items():
+            if isinstance(info.writer, CompressedRecordWriter):
+                info.writer.end_frame()
+            info.fp.flush()
+            open_files[lang] = (info.bucket_dt, info.file_path, os.path.getsize(info.file_path), info.count)
+        return RepackCheckpoint(open_files, self.file_counts, self.merged_sizes)
 
-        self.fouts[post_data["lang"]] = WriteInfo(bucket_dt, jsonl_file, writer)
+    def restore_checkpoint(self, state: Optional[RepackCheckpoint]) -> None:
+        """
+        reopen the files, that were open at the checkpoint and cut off what was written (or merged) after it
+        """
+        if state is None:
+            return
+        open_files, self.file_counts, self.merged_sizes = state.open_files, state.file_counts, state.merged_sizes
+        for dest_file, size in self.merged_sizes.items():
+            os.truncate(dest_file, size)
+        self._remove_part_files()
+        # the day of the interrupted tar file might exist already
+        self.skip_day = False
+        for lang, (bucket_dt, file_path, size, count) in open_files.items():
+            if not self._writes_compressed():
+                gz_file_path = file_path.parent / f"{file_path.name}.gz"
+                if not file_path.exists() and gz_file_path.exists():
+                    # finalized after the checkpoint
+                    file_path.write_bytes(gzip.decompress(gz_file_path.read_bytes())[:size])
+                gz_file_path.unlink(missing_ok=True)
+            os.truncate(file_path, size)
+            self.fouts[lang] = self._open_writer(bucket_dt, file_path, append=True)
+            self.fouts[lang].count = count
 
     def _check_day_exists(self, y_m_d_str: str) -> bool:
         return (self.base_path / y_m_d_str).exists()
@@ -129,10 +299,14 @@ class RepackEntriesMethod(IterationMethod):
                 self._finalize_file(info)
                 self._init_file_out(post_data)
 
+        if self.projection:
+            post_data = self.projection(post_data)
         self.fouts[lang].writer.write(post_data)
+        self.fouts[lang].count += 1
 
     def finalize(self):
         self.finalize_files()
+        store_repack_file_counts(self.file_counts.values())
 
     def set_ds_status_field(self, status: MonthDatasetStatus) -> None:
         pass
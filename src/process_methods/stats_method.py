@@ -5,6 +5,7 @@ from typing import Optional, Any
 
 from src.consts import METHOD_STATS, locationindex_type, METHOD_FILTER, BASE_STAT_PATH, logger
 from src.models import IterationSettings
+from src.post_columns import PostColumns
 from src.process_methods.abstract_method import IterationMethod
 from src.status import MonthDatasetStatus
 from src.util import year_month_str, get_hashtags
@@ -54,6 +55,31 @@ class StatsCollectionMethod(IterationMethod):
     def name() -> str:
         return METHOD_STATS
 
+    @staticmethod
+    def parallel_safe() -> bool:
+        return True
+
+    def partial_result(self) -> tuple[dict[str, CollectionStats], dict[str, Counter[str]]]:
+        return self.stats.items, self.hashtags
+
+    def checkpoint_state(self) -> tuple[dict[str, CollectionStats], dict[str, Counter[str]]]:
+        return self.stats.items, self.hashtags
+
+    def restore_checkpoint(self, state: Optional[tuple[dict[str, CollectionStats], dict[str, Counter[str]]]]) -> None:
+        if state is not None:
+            self.stats.items, self.hashtags = state
+
+    def merge(self, partial: tuple[dict[str, CollectionStats], dict[str, Counter[str]]]) -> None:
+        tar_files_stats, hashtags = partial
+        for tar_file, tar_file_stats in tar_files_stats.items():
+            merged_tar_file_stats = self.stats.items.setdefault(tar_file, CollectionStats(items={}))
+            for jsonl_file, jsonl_file_stats in tar_file_stats.items.items():
+                merged_jsonl_stats = merged_tar_file_stats.items.setdefault(jsonl_file, CollectionStats())
+                merged_jsonl_stats.total_posts += jsonl_file_stats.total_posts
+                merged_jsonl_stats.accepted_posts += jsonl_file_stats.accepted_posts
+        for lang, lang_hashtags in hashtags.items():
+            self.hashtags.setdefault(lang, Counter()).update(lang_hashtags)
+
     def _process_data(self, post_data: dict, location_index: locationindex_type):
 
         dump_path, tar_file, jsonl_file, index = location_index
@@ -66,6 +92,25 @@ class StatsCollectionMethod(IterationMethod):
         if self.collect_hashtags:
             self.hashtags[post_data["lang"]].update(get_hashtags(post_data))
 
+    def _process_batch(self, posts: list[dict],
+                       location_indices: list[locationindex_type],
+                       columns: PostColumns) -> list[bool]:
+        # count the languages for each jsonl file of the batch, then update the stats once per file
+        file_lang_counts: dict[tuple[str, str], Counter[str]] = {}
+        for (dump_path, tar_file, jsonl_file, index), lang in zip(location_indices, columns.lang):
+            file_lang_counts.setdefault((tar_file, jsonl_file), Counter())[lang] += 1
+
+        for (tar_file, jsonl_file), lang_counts in file_lang_counts.items():
+            tar_file_stat = self.stats.items.setdefault(tar_file, CollectionStats(items={}))
+            jsonl_stats = tar_file_stat.items.setdefault(jsonl_file, CollectionStats())
+            jsonl_stats.total_posts += lang_counts.total()
+            jsonl_stats.accepted_posts.update(lang_counts)
+
+        if self.collect_hashtags:
+            for post_data, lang in zip(posts, columns.lang):
+                self.hashtags[lang].update(get_hashtags(post_data))
+        return [True] * len(posts)
+
     def finalize(self):
         for tar_file, tar_file_stats in self.stats.items.items():
             for jsonl_file, jsonl_file_stats in tar_file_stats.items.items():
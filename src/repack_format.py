@@ -0,0 +1,172 @@
+"""
+Compact binary format of the repack files, as alternative to jsonl.gz.
+Each record is the json of a post with a 4 byte (little endian) length prefix.
+The records are compressed with zstd (if zstandard is installed) or gzip:
+<bucket>.pack.zst / <bucket>.pack.gz
+
+Compressed streams can be concatenated (multiple zstd frames / gzip members) and so can the records,
+so part files of workers can be appended to each other, like the jsonl.gz files.
+"""
+import gzip
+import io
+import json
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Generator, Literal, Optional, Callable
+
+from jsonlines import jsonlines
+
+from src.consts import CONFIG, logger
+from src.util import iter_gzip_file_lines
+
+PackCompression = Literal["zstd", "gzip"]
+
+PACK_SUFFIX = ".pack"
+COMPRESSION_SUFFIXES: dict[PackCompression, str] = {
+    "zstd": ".zst",
+    "gzip": ".gz"
+}
+RECORD_HEADER = struct.Struct("<I")
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+
+    dumps_post: Callable[[dict], bytes] = orjson.dumps
+except ImportError:
+    def dumps_post(post_data: dict) -> bytes:
+        return json.dumps(post_data, ensure_ascii=False).encode("utf-8")
+
+
+def available_compression(compression: PackCompression) -> PackCompression:
+    """
+    the compression to use. falls back to gzip, if zstandard is not installed
+    """
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed. Writing gzip pack files")
+        return "gzip"
+    return compression
+
+
+def pack_file_suffix(compression: PackCompression) -> str:
+    return f"{PACK_SUFFIX}{COMPRESSION_SUFFIXES[compression]}"
+
+
+class CompressedRecordWriter(ABC):
+    """
+    writes records into a compressed stream of an opened (binary) file.
+    The file is not closed by the writer
+    """
+
+    def __init__(self, fp: BinaryIO, compression: PackCompression, compression_level: Optional[int] = None):
+        self.fp = fp
+        self.compression = compression
+        self.compression_level = compression_level
+        self._stream: Optional[BinaryIO] = None
+
+    def _open_stream(self) -> BinaryIO:
+        if self.compression == "zstd":
+            level = 3 if self.compression_level is None else self.compression_level
+            return zstandard.ZstdCompressor(level=level).stream_writer(self.fp, closefd=False)
+        level = 9 if self.compression_level is None else self.compression_level
+        return gzip.GzipFile(fileobj=self.fp, mode="wb", compresslevel=level)
+
+    @abstractmethod
+    def _write_record(self, stream: BinaryIO, post_data: dict):
+        pass
+
+    def write(self, post_data: dict):
+        if self._stream is None:
+            self._stream = self._open_stream()
+        self._write_record(self._stream, post_data)
+
+    def end_frame(self):
+        """
+        end the current zstd frame / gzip member, so that the file is complete up to here.
+        The next write starts a new one
+        """
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        self.fp.flush()
+
+    def close(self):
+        self.end_frame()
+
+
+class PackWriter(CompressedRecordWriter):
+    """
+    length prefixed json records
+    """
+
+    def _write_record(self, stream: BinaryIO, post_data: dict):
+        data = dumps_post(post_data)
+        stream.write(RECORD_HEADER.pack(len(data)))
+        stream.write(data)
+
+
+class JsonlGzipWriter(CompressedRecordWriter):
+    """
+    json lines (as written by jsonlines), directly into a gzip file
+    """
+
+    def __init__(self, fp: BinaryIO, compression_level: Optional[int] = None):
+        super().__init__(fp, "gzip", compression_level)
+        self._jsonl_writer: Optional[jsonlines.Writer] = None
+
+    def _open_stream(self) -> BinaryIO:
+        stream = super()._open_stream()
+        self._jsonl_writer = jsonlines.Writer(stream)
+        return stream
+
+    def _write_record(self, stream: BinaryIO, post_data: dict):
+        self._jsonl_writer.write(post_data)
+
+    def end_frame(self):
+        if self._jsonl_writer is not None:
+            self._jsonl_writer.close()
+            self._jsonl_writer = None
+        super().end_frame()
+
+
+def _open_decompressed(fin: BinaryIO, path: Path) -> BinaryIO:
+    if path.suffix == COMPRESSION_SUFFIXES["zstd"]:
+        if zstandard is None:
+            raise ImportError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().stream_reader(fin, read_across_frames=True)
+    return gzip.GzipFile(fileobj=fin)
+
+
+def iter_pack_file_records(path: Path, buffer_size: Optional[int] = None) -> Generator[bytes, None, None]:
+    """
+    stream the raw json records of a pack file
+    """
+    buffer_size = buffer_size or CONFIG.READ_BUFFER_SIZE
+    with path.open("rb", buffering=buffer_size) as fin:
+        with io.BufferedReader(_open_decompressed(fin, path), buffer_size=buffer_size) as decompressed:
+            read = decompressed.read
+            while header := read(RECORD_HEADER.size):
+                size, = RECORD_HEADER.unpack(header)
+                yield read(size)
+
+
+def is_repack_file(path: Path) -> bool:
+    return path.name.endswith(".jsonl.gz") or PACK_SUFFIX in path.suffixes
+
+
+def iter_repack_file_records(path: Path) -> Generator[bytes, None, None]:
+    """
+    raw json records (lines) of a repack file in any of the formats
+    """
+    if PACK_SUFFIX in path.suffixes:
+        return iter_pack_file_records(path)
+    return iter_gzip_file_lines(path)
+
+
+def count_repack_file_records(path: Path) -> int:
+    return sum(1 for _ in iter_repack_file_records(path))
@@ -0,0 +1,115 @@
+"""
+Persisted index of the jsonl members of the daily tar files of a dump.
+(member name -> data offset, size, compression)
+
+tarfile has to scan the headers from the start of the archive, to find a member (or list all members).
+The index is built once for each tar file and stored in BASE_TAR_INDEX_PATH, so members can be read with
+a seek.
+"""
+import tarfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, PrivateAttr
+
+from src.consts import BASE_TAR_INDEX_PATH, logger
+
+MemberCompression = Literal["bz2", "gz"]
+
+
+def relevant_tar_members(tar: tarfile.TarFile) -> list[tarfile.TarInfo]:
+    relevant_members = [member for member in tar.getmembers() if
+                        (member.name.endswith('.json.bz2') or member.name.endswith('.json.gz'))]
+
+    # sort them (their name includes the datetime)
+    def sort_key(tar_info):
+        return Path(tar_info.name).stem.split('.')[0]
+
+    return sorted(relevant_members, key=sort_key)
+
+
+class TarMember(BaseModel):
+    name: str
+    offset_data: int
+    size: int
+    compression: MemberCompression
+
+    def tarinfo(self) -> tarfile.TarInfo:
+        """
+        a TarInfo that can be passed to TarFile.extractfile, without the TarFile looking for it
+        """
+        tar_info = tarfile.TarInfo(self.name)
+        tar_info.size = self.size
+        tar_info.offset_data = self.offset_data
+        return tar_info
+
+
+class TarIndex(BaseModel):
+    # to detect changed tar files
+    tar_size: int
+    tar_mtime_ns: int
+    members: list[TarMember]
+    _members_by_name: dict[str, TarMember] = PrivateAttr(default_factory=dict)
+
+    @staticmethod
+    def index_file_path(tar_file: Path) -> Path:
+        return BASE_TAR_INDEX_PATH / tar_file.parent.name / f"{tar_file.stem}.json"
+
+    @staticmethod
+    def build(tar_file: Path) -> "TarIndex":
+        """
+        :raises tarfile.ReadError: if the members cannot be read
+        """
+        logger.info(f"building tar index: {tar_file.name}")
+        stat = tar_file.stat()
+        with tarfile.open(tar_file, 'r') as tar:
+            members = [TarMember(name=member.name,
+                                 offset_data=member.offset_data,
+                                 size=member.size,
+                                 compression="bz2" if member.name.endswith("bz2") else "gz")
+                       for member in relevant_tar_members(tar)]
+        return TarIndex(tar_size=stat.st_size, tar_mtime_ns=stat.st_mtime_ns, members=members)
+
+    @staticmethod
+    def load(tar_file: Path) -> "TarIndex":
+        """
+        load the index of a tar file. builds and stores it, if it does not exist or the tar file changed
+        """
+        index_file = TarIndex.index_file_path(tar_file)
+        if index_file.exists():
+            index = TarIndex.model_validate_json(index_file.read_text(encoding="utf-8"))
+            stat = tar_file.stat()
+            if index.tar_size == stat.st_size and index.tar_mtime_ns == stat.st_mtime_ns:
+                return index
+            logger.warning(f"tar file changed. rebuilding index: {tar_file.name}")
+        index = TarIndex.build(tar_file)
+        index.store(tar_file)
+        return index
+
+    def store(self, tar_file: Path):
+        index_file = TarIndex.index_file_path(tar_file)
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        index_file.write_text(self.model_dump_json(), encoding="utf-8")
+
+    def member(self, name: str) -> TarMember:
+        """
+        :raises KeyError: if the member is not in the tar file
+        """
+        if not self._members_by_name:
+            self._members_by_name = {member.name: member for member in self.members}
+        return self._members_by_name[name]
+
+
+@lru_cache(maxsize=64)
+def load_tar_index(tar_file: Path) -> TarIndex:
+    """
+    cached TarIndex.load
+    """
+    return TarIndex.load(tar_file)
+
+
+def read_member(tar_file: Path, member: TarMember) -> bytes:
+    with tar_file.open("rb") as fin:
+        fin.seek(member.offset_data)
+        return fin.read(member.size)
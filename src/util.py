@@ -3,17 +3,22 @@ import gzip
 import io
 import json
 import tarfile
+import threading
 import zlib
 from datetime import datetime
 from pathlib import Path
+from queue import Queue, Full
 from tarfile import ReadError
-from typing import Generator, Union, Optional
+from typing import Generator, Union, Optional, BinaryIO, Iterator, Iterable, TypeVar
 
 from deprecated import deprecated
 from jsonlines import jsonlines
 
 from src.consts import logger, CONFIG
 from src.models import IterationSettings, SingleLanguageSettings
+from src.tar_index import load_tar_index
+
+T = TypeVar("T")
 
 
 def get_base_dump_path(year: int, month: int) -> Path:
@@ -46,47 +51,129 @@ def iter_jsonl_data2(path: Path) -> Generator[dict, None, None]:
         for line in gz_file:
             yield line
 
+def iter_gzip_file_lines(path: Path, buffer_size: Optional[int] = None) -> Generator[bytes, None, None]:
+    """
+    stream the raw lines of a gzip file. The decompressed data is read in chunks of buffer_size
+    (default CONFIG.READ_BUFFER_SIZE), so memory is bounded by that and not the file size
+    """
+    buffer_size = buffer_size or CONFIG.READ_BUFFER_SIZE
+    with path.open("rb", buffering=buffer_size) as fin:
+        with io.BufferedReader(gzip.GzipFile(fileobj=fin), buffer_size=buffer_size) as gz_file:
+            for line in gz_file:
+                yield line
+
+
 def read_gzip_file_and_count_lines(path: Path) -> int:
     with gzip.open(path, 'rt', encoding='utf-8') as gz_file:
         return sum(1 for _ in gz_file)
 
 
-def iter_jsonl_files_data(tar_file: Path) -> Generator[tuple[str, bytes], None, None]:
+def open_compressed(fileobj: BinaryIO, name: str) -> Union[bz2.BZ2File, gzip.GzipFile]:
+    """
+    decompressing (readable, forward seekable) file object for a bz2 or gzip file(-object)
+    """
+    if name.endswith("bz2"):
+        return bz2.BZ2File(fileobj)
+    else:
+        return gzip.GzipFile(fileobj=fileobj)
+
+
+def iter_compressed_lines(fileobj: BinaryIO, name: str) -> Generator[bytes, None, None]:
+    """
+    decompress a bz2 or gzip file(-object) incrementally and yield its raw lines.
+    errors are logged and end the iteration of this file
+    """
+    decompressed = open_compressed(fileobj, name)
+    try:
+        with decompressed:
+            for line in decompressed:
+                yield line
+    except (OSError, EOFError, zlib.error) as err:
+        logger.error(f"Error reading {name}: {str(err)}")
+
+
+def iter_jsonl_files_lines(tar_file: Path) -> Generator[tuple[str, Iterator[bytes]], None, None]:
+    """
+    iterate through the compressed jsonl members of a tar file and yield (member name, line iterator).
+    the lines are decompressed while iterating, so the line iterator should be consumed (or dropped)
+    before moving to the next member
+    """
+    try:
+        tar_index = load_tar_index(tar_file)
+    except ReadError as err:
+        logger.error(f"Error getting members of tar file: {tar_file}")
+        logger.error(err)
+        return
+
+    # the members are read at their indexed offset, the TarFile does not need to scan for them
     with tarfile.open(tar_file, 'r') as tar:
+        for member in tar_index.members:
+            extracted_file = tar.extractfile(member.tarinfo())
+            yield member.name, iter_compressed_lines(extracted_file, member.name)
+
+
+def iter_jsonl_files_data(tar_file: Path) -> Generator[tuple[str, bytes], None, None]:
+    for member_name, lines in iter_jsonl_files_lines(tar_file):
+        yield member_name, b"".join(lines)
+
+
+class _PrefetchError:
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_PREFETCH_END = object()
+
+
+def prefetch(items: Iterable[T], depth: int) -> Generator[T, None, None]:
+    """
+    iterate the items in a background thread, which stays up to `depth` items ahead of the consumer.
+    Exceptions of the producer are raised in the consumer.
+    depth < 1: no background thread
+    """
+    if depth < 1:
+        yield from items
+        return
+
+    queue: Queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
         try:
-            relevant_members = [member for member in tar.getmembers() if
-                                (member.name.endswith('.json.bz2') or member.name.endswith('.json.gz'))]
-        except ReadError as err:
-            logger.error(f"Error getting members of tar file: {tar_file}")
-            logger.error(err)
-            return []
-
-        # sort them (their name includes the datetime)
-        def sort_key(tar_info):
-            return Path(tar_info.name).stem.split('.')[0]
-
-        relevant_members = sorted(relevant_members, key=sort_key)
-
-        for member in relevant_members:
-            extracted_file = tar.extractfile(member)
-            if member.name.endswith("bz2"):
-                if extracted_file is not None:
-                    try:
-                        decompressed_data = bz2.decompress(extracted_file.read())
-                        yield member.name, decompressed_data
-                    except Exception as e:
-                        print(f"Error processing {member.name}: {str(e)}")
-            else:
-                try:
-                    data = extracted_file.read()
-                    with gzip.GzipFile(fileobj=io.BytesIO(data)) as gz_bytes:
-                        yield member.name, gz_bytes.read()
-                except ReadError as err:
-                    logger.error(f"Error reading {member.name}: {str(err)}")
-                    return None
-                except zlib.error as e:
-                    logger.error(f"Error reading {member.name}: {str(e)}")
-                    return None
+            for item in items:
+                if not put(item):
+                    return
+            put(_PREFETCH_END)
+        except BaseException as err:
+            put(_PrefetchError(err))
+        finally:
+            close = getattr(items, "close", None)
+            if close:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is _PREFETCH_END:
+                return
+            if isinstance(item, _PrefetchError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        producer.join()
 
 
 def iter_jsonl_file(fp: Path) -> Generator[dict, None, None]: